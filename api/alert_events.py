@@ -0,0 +1,65 @@
+# alert_events.py
+import logging
+import threading
+import time
+from generate_alerts import generate_product_alerts
+
+
+class AlertEventQueue:
+    """
+    File des produits modifiés (inventaire, commandes) à réévaluer par les règles de stock
+    et de commandes. Les écritures appellent enqueue() après leur commit ; un thread
+    regroupe les produits pendant `debounce_seconds` puis lance generate_product_alerts().
+    Tant que start() n'a pas été appelé, enqueue() ne fait rien (mode balayage seul).
+    """
+
+    def __init__(self, debounce_seconds=2):
+        self.debounce_seconds = debounce_seconds
+        self._dirty = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._app = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def enqueue(self, *product_ids):
+        """Signale des produits dont l'inventaire ou les commandes ont changé"""
+        if not self.enabled:
+            return
+        with self._condition:
+            self._dirty.update(pid for pid in product_ids if pid is not None)
+            self._condition.notify()
+
+    def start(self, app):
+        """Démarre le thread de réévaluation dans le contexte de l'application"""
+        if self._thread is not None:
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print("✅ Évaluation incrémentale des alertes démarrée")
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._dirty:
+                self._condition.wait()
+        # Laisser les écritures rapprochées s'accumuler avant d'évaluer
+        time.sleep(self.debounce_seconds)
+        with self._condition:
+            batch, self._dirty = self._dirty, set()
+        return batch
+
+    def _run(self):
+        while True:
+            product_ids = self._take_batch()
+            try:
+                with self._app.app_context():
+                    generate_product_alerts(product_ids)
+            except Exception as e:
+                logging.error(f"❌ Erreur lors de la réévaluation des produits {sorted(product_ids)} : {str(e)}")
+
+
+# File partagée par le processus
+alert_events = AlertEventQueue()
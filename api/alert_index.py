@@ -0,0 +1,173 @@
+# alert_index.py
+from datetime import datetime
+from contextlib import contextmanager
+import logging
+import threading
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Alert, User
+from alert_metrics import alert_metrics
+
+# Nombre d'alertes par insertion groupée : un lot rejeté est réécrit ligne par ligne
+FLUSH_CHUNK_SIZE = 500
+
+
+class ActiveAlertIndex:
+    """
+    Index en mémoire des alertes actives (statut != "résolu"), indexées par (product_id, type).
+    - Chargé en une seule requête au début d'un cycle de génération (voir batch()).
+    - Les nouvelles alertes sont mises en attente puis écrites par insertions groupées (flush()).
+    - resolve_alert (app.py) et les alertes d'écart de poids (shelves.py) le tiennent à jour
+      via discard() et register().
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._pending = []
+        self._loaded = False
+        self.default_user_id = None
+        # Un seul cycle de génération à la fois par processus
+        self._batch_lock = threading.RLock()
+        self._batch_depth = 0
+        # Threads participant au cycle en cours (le propriétaire et les threads rattachés)
+        self._participants = set()
+        # Protège _keys et _pending
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Recharge les alertes actives et l'administrateur par défaut (une requête chacun)"""
+        keys = set(db.session.query(Alert.product_id, Alert.type).filter(
+            Alert.status != "résolu"
+        ).all())
+        admin_user = User.query.filter_by(role='admin').first()
+        with self._lock:
+            self._keys = keys
+            self._loaded = True
+        self.default_user_id = admin_user.id if admin_user else None
+
+    def in_batch(self):
+        """Indique si le thread courant participe à un cycle de génération"""
+        return threading.get_ident() in self._participants
+
+    @contextmanager
+    def batch(self):
+        """
+        Ouvre un cycle de génération : l'index est rechargé à l'entrée,
+        les alertes en attente sont écrites à la sortie.
+        """
+        with self._batch_lock:
+            outer = self._batch_depth == 0
+            if outer:
+                self.load()
+                self._participants = {threading.get_ident()}
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if outer:
+                    try:
+                        self.flush()
+                    finally:
+                        self._participants = set()
+
+    @contextmanager
+    def attach(self):
+        """
+        Rattache le thread courant au cycle ouvert par un autre thread (exécution parallèle des règles) :
+        ses alertes sont dédupliquées sur le même index et écrites avec la même insertion groupée.
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._participants.add(thread_id)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._participants.discard(thread_id)
+
+    def contains(self, product_id, alert_type):
+        with self._lock:
+            return (product_id, alert_type) in self._keys
+
+    def add(self, product_id, alert_type, status="non traité", user_id=None, message=None):
+        """
+        Met en attente une nouvelle alerte si aucune alerte active identique n'existe.
+        Retourne l'alerte (non encore écrite) ou None si c'est un doublon.
+        """
+        if product_id is None:
+            # Alert.product_id est obligatoire : l'insertion échouerait
+            logging.warning(f"⚠️ Échec de création de l'alerte : produit manquant pour {alert_type}")
+            return None
+        key = (product_id, alert_type)
+        with self._lock:
+            if key in self._keys:
+                logging.warning(f"⚠️ Alerte déjà existante : {alert_type} (Produit ID: {product_id})")
+                return None
+            self._keys.add(key)
+            alert = Alert(
+                product_id=product_id,
+                type=alert_type,
+                status=status,
+                created_at=datetime.utcnow(),
+                user_id=user_id if user_id is not None else self.default_user_id,
+                message=message
+            )
+            # Règle qui a produit l'alerte : comptée dans ses mesures une fois écrite
+            self._pending.append((alert, alert_metrics.current_rule()))
+        return alert
+
+    def register(self, product_id, alert_type):
+        """Signale une alerte active créée en dehors de l'index"""
+        if self._loaded:
+            with self._lock:
+                self._keys.add((product_id, alert_type))
+
+    def discard(self, product_id, alert_type):
+        """Signale qu'une alerte n'est plus active (résolue ou supprimée)"""
+        with self._lock:
+            self._keys.discard((product_id, alert_type))
+
+    def discard_product(self, product_id):
+        """Retire toutes les alertes d'un produit supprimé"""
+        with self._lock:
+            self._keys = {key for key in self._keys if key[0] != product_id}
+
+    def flush(self):
+        """
+        Écrit les alertes en attente par lots de FLUSH_CHUNK_SIZE (une insertion groupée par lot).
+        Si un lot est rejeté (une ligne invalide suffit), ses alertes sont réécrites une par une :
+        seules les alertes refusées sont perdues. Retourne le nombre d'alertes écrites.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        written = 0
+        for start in range(0, len(pending), FLUSH_CHUNK_SIZE):
+            chunk = pending[start:start + FLUSH_CHUNK_SIZE]
+            try:
+                db.session.bulk_save_objects([alert for alert, _ in chunk])
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                logging.warning(f"⚠️ Échec de l'insertion groupée de {len(chunk)} alertes : écriture une par une")
+                chunk = [(alert, stats) for alert, stats in chunk if self._write_one(alert)]
+            for alert, stats in chunk:
+                alert_metrics.record_alert(1, stats)
+                logging.info(f"✅ Alerte générée : {alert.type} (Produit ID: {alert.product_id})")
+            written += len(chunk)
+        return written
+
+    def _write_one(self, alert):
+        try:
+            db.session.add(alert)
+            db.session.commit()
+            return True
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            with self._lock:
+                self._keys.discard((alert.product_id, alert.type))
+            logging.warning(f"⚠️ Alerte refusée : {alert.type} (Produit ID: {alert.product_id}) : {e.__class__.__name__}")
+            return False
+
+
+# Index partagé par le processus
+active_alerts = ActiveAlertIndex()
@@ -0,0 +1,112 @@
+# alert_metrics.py
+from datetime import datetime
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Compteurs de la règle en cours d'exécution, propres à chaque thread
+_local = threading.local()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    """Compte les requêtes SQL et les lignes lues pendant une règle mesurée"""
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        return
+    stats['sql_statements'] += 1
+    # Lignes renvoyées par les SELECT (rowcount = lignes lues côté PyMySQL)
+    if cursor.description is not None and cursor.rowcount and cursor.rowcount > 0:
+        stats['rows_scanned'] += cursor.rowcount
+
+
+class AlertMetrics:
+    """
+    Mesures par règle d'un cycle de génération d'alertes :
+    durée, nombre de requêtes SQL, lignes lues et alertes créées.
+    Le dernier cycle est conservé pour l'endpoint d'administration.
+    """
+
+    def __init__(self):
+        self.last_run = None
+        self._current = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def run(self):
+        """Mesure un cycle complet"""
+        started = time.perf_counter()
+        current = {
+            'started_at': datetime.utcnow().isoformat(),
+            'status': 'ok',
+            'rules': []
+        }
+        self._current = current
+        try:
+            yield current
+        except Exception:
+            current['status'] = 'error'
+            raise
+        finally:
+            current['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            current['alerts_created'] = sum(r['alerts_created'] for r in current['rules'] if r['rule'] != 'bulk_write')
+            current['sql_statements'] = sum(r['sql_statements'] for r in current['rules'])
+            self._current = None
+            self.last_run = current
+            logging.info(json.dumps({
+                'event': 'alert_run',
+                'started_at': current['started_at'],
+                'status': current['status'],
+                'duration_ms': current['duration_ms'],
+                'alerts_created': current['alerts_created'],
+                'sql_statements': current['sql_statements']
+            }, ensure_ascii=False))
+
+    @contextmanager
+    def rule(self, name):
+        """Mesure une règle exécutée dans le thread courant"""
+        stats = {
+            'rule': name,
+            'status': 'ok',
+            'sql_statements': 0,
+            'rows_scanned': 0,
+            'alerts_created': 0
+        }
+        previous = getattr(_local, 'stats', None)
+        _local.stats = stats
+        started = time.perf_counter()
+        try:
+            yield stats
+        except Exception as e:
+            stats['status'] = 'error'
+            stats['error'] = str(e)
+            raise
+        finally:
+            stats['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            _local.stats = previous
+            with self._lock:
+                if self._current is not None:
+                    self._current['rules'].append(stats)
+            logging.info(json.dumps(dict(stats, event='alert_rule'), ensure_ascii=False))
+
+    def current_rule(self):
+        """Mesures de la règle en cours dans ce thread (None hors d'une règle mesurée)"""
+        return getattr(_local, 'stats', None)
+
+    def record_alert(self, count=1, stats=None):
+        """
+        Comptabilise des alertes écrites en base, pour la règle en cours
+        ou pour la règle `stats` qui les a produites (écriture groupée en fin de cycle)
+        """
+        stats = stats if stats is not None else getattr(_local, 'stats', None)
+        if stats is not None:
+            with self._lock:
+                stats['alerts_created'] += count
+
+
+# Mesures partagées par le processus
+alert_metrics = AlertMetrics()
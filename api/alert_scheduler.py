@@ -0,0 +1,210 @@
+# alert_scheduler.py
+from datetime import datetime, timedelta
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from models import db, SchedulerLock
+
+# Identifiant de ce processus pour l'élection du leader
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Bail du leader : court, renouvelé pendant l'exécution, libéré à la fin.
+# Un processus arrêté brutalement ne bloque la tâche que pendant LEASE_TTL.
+LEASE_TTL = timedelta(minutes=2)
+# Renouvellement du bail pendant l'exécution
+LEASE_HEARTBEAT_SECONDS = 30
+
+# Une seule exécution à la fois par tâche dans ce processus
+_running = {}
+_running_guard = threading.Lock()
+# Baux détenus par ce processus {nom: application}, libérés à l'arrêt
+_held = {}
+
+
+def ensure_lock_table():
+    """Crée la table scheduler_locks si elle n'existe pas (base déployée avant son ajout)"""
+    SchedulerLock.__table__.create(db.engine, checkfirst=True)
+
+
+def acquire_leadership(name, ttl=LEASE_TTL, min_interval=None):
+    """
+    Prend le bail du verrou `name` en base jusqu'à maintenant + ttl.
+    - min_interval : refuse le bail si la tâche a déjà démarré (dans n'importe quel processus)
+      depuis moins de min_interval : les déclenchements décalés des autres processus ne la relancent pas.
+    Retourne True si ce processus est le leader.
+    """
+    now = datetime.utcnow()
+    conditions = [
+        SchedulerLock.name == name,
+        or_(
+            SchedulerLock.owner == WORKER_ID,
+            SchedulerLock.owner.is_(None),
+            SchedulerLock.expires_at < now
+        )
+    ]
+    if min_interval is not None:
+        conditions.append(or_(
+            SchedulerLock.last_run_started_at.is_(None),
+            SchedulerLock.last_run_started_at <= now - min_interval
+        ))
+    updated = SchedulerLock.query.filter(*conditions).update({
+        SchedulerLock.owner: WORKER_ID,
+        SchedulerLock.expires_at: now + ttl
+    }, synchronize_session=False)
+    if updated:
+        db.session.commit()
+        return True
+
+    # Aucune ligne disponible : soit le verrou n'existe pas encore, soit il est détenu ou la tâche est récente
+    if db.session.get(SchedulerLock, name) is not None:
+        db.session.rollback()
+        return False
+    try:
+        db.session.add(SchedulerLock(name=name, owner=WORKER_ID, expires_at=now + ttl))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def renew_leadership(name, ttl=LEASE_TTL):
+    """Prolonge le bail détenu par ce processus. Retourne False s'il a été perdu."""
+    updated = SchedulerLock.query.filter_by(name=name, owner=WORKER_ID).update({
+        SchedulerLock.expires_at: datetime.utcnow() + ttl
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(updated)
+
+
+def release_leadership(name):
+    """Libère le bail détenu par ce processus : un autre processus peut mener dès le prochain déclenchement"""
+    SchedulerLock.query.filter_by(name=name, owner=WORKER_ID).update({
+        SchedulerLock.owner: None,
+        SchedulerLock.expires_at: None
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def _heartbeat(app, name, ttl, stop):
+    """Renouvelle le bail toutes les LEASE_HEARTBEAT_SECONDS tant que la tâche s'exécute"""
+    while not stop.wait(LEASE_HEARTBEAT_SECONDS):
+        try:
+            with app.app_context():
+                if not renew_leadership(name, ttl):
+                    logging.warning(f"⚠️ Bail de la tâche {name} perdu pendant l'exécution")
+        except Exception as e:
+            logging.error(f"❌ Renouvellement du bail de la tâche {name} impossible : {str(e)}")
+
+
+@atexit.register
+def _release_held_leases():
+    """Arrêt du processus : libère les baux des tâches en cours"""
+    for name, app in list(_held.items()):
+        try:
+            with app.app_context():
+                release_leadership(name)
+        except Exception:
+            pass
+
+
+def _record_run(name, started_at, duration_ms, status, error=None):
+    SchedulerLock.query.filter_by(name=name).update({
+        SchedulerLock.last_run_owner: WORKER_ID,
+        SchedulerLock.last_run_started_at: started_at,
+        SchedulerLock.last_run_duration_ms: duration_ms,
+        SchedulerLock.last_run_status: status,
+        SchedulerLock.last_run_error: error[:255] if error else None
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def _run_with_heartbeat(name, fn, ttl):
+    """Exécute fn() en renouvelant le bail, puis enregistre la durée et le résultat"""
+    app = current_app._get_current_object()
+    _held[name] = app
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(app, name, ttl, stop), daemon=True)
+    heartbeat.start()
+
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        db.session.rollback()
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        logging.error(f"❌ Échec de la tâche {name} après {duration_ms} ms : {str(e)}")
+        _record_run(name, started_at, duration_ms, "error", str(e))
+        return "error"
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    _record_run(name, started_at, duration_ms, "ok")
+    return "ok"
+
+
+def run_as_leader(name, fn, min_interval=None, ttl=LEASE_TTL):
+    """
+    Exécute fn() seulement si ce processus obtient le bail de la tâche `name`
+    et qu'aucune exécution précédente n'est encore en cours.
+    Le bail est renouvelé pendant fn() puis libéré ; min_interval empêche les autres
+    processus de relancer la tâche juste après (voir acquire_leadership()).
+    Retourne "ok", "error", "skipped" (exécution en cours) ou "not_leader".
+    """
+    with _running_guard:
+        lock = _running.setdefault(name, threading.Lock())
+    if not lock.acquire(blocking=False):
+        logging.info(f"⏭️ Tâche {name} ignorée : l'exécution précédente n'est pas terminée")
+        return "skipped"
+
+    try:
+        try:
+            leader = acquire_leadership(name, ttl, min_interval)
+        except Exception as e:
+            # Table des verrous absente ou base indisponible : la tâche est retentée au prochain déclenchement
+            db.session.rollback()
+            logging.error(f"❌ Bail de la tâche {name} impossible à prendre : {str(e)}")
+            return "error"
+        if not leader:
+            return "not_leader"
+        try:
+            return _run_with_heartbeat(name, fn, ttl)
+        finally:
+            _held.pop(name, None)
+            try:
+                release_leadership(name)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"❌ Libération du bail de la tâche {name} impossible : {str(e)}")
+    finally:
+        lock.release()
+
+
+def get_scheduler_status(name):
+    """État du verrou et de la dernière exécution de la tâche"""
+    lock = db.session.get(SchedulerLock, name)
+    if lock is None:
+        return {'name': name, 'leader': None, 'is_leader': False, 'last_run': None}
+    return {
+        'name': name,
+        'leader': lock.owner,
+        'lease_expires_at': lock.expires_at.isoformat() if lock.expires_at else None,
+        'is_leader': lock.owner == WORKER_ID and lock.expires_at is not None and lock.expires_at > datetime.utcnow(),
+        'worker_id': WORKER_ID,
+        'last_run': {
+            'owner': lock.last_run_owner,
+            'started_at': lock.last_run_started_at.isoformat() if lock.last_run_started_at else None,
+            'duration_ms': lock.last_run_duration_ms,
+            'status': lock.last_run_status,
+            'error': lock.last_run_error
+        }
+    }
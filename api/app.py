@@ -2,7 +2,7 @@
 import requests
 from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
-from models import db, User, Product, Category, Zone, Inventory, Sensor, SensorData,Customer, Alert, Order, OrderPrediction
+from models import db, User, Product, Category, Zone, Inventory, Sensor, SensorData,Customer, Alert, Order, OrderPrediction, RFIDReader, DEFAULT_ZONE_CAPACITY
 from datetime import datetime
 from functools import wraps
 from flask_jwt_extended import verify_jwt_in_request, get_jwt 
@@ -12,14 +12,29 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 from datetime import timedelta
 from werkzeug.security import generate_password_hash
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
-from generate_alerts import generate_all_alerts  
+from generate_alerts import generate_all_alerts, clear_seasonal_profiles
+from alert_index import active_alerts
+from alert_metrics import alert_metrics
+from alert_scheduler import run_as_leader, get_scheduler_status, ensure_lock_table
+from forecasting import generate_forecasts, remove_product_forecasts
+from alert_events import alert_events
+from indicator_cache import prediction_indicators
+from readings import normalize_uid, grams_to_kg, extract_weight, frame_with_weight, SOURCE_DOOR
+import json
+import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 import serial
 import threading
+from rfid_ingest import parse_bulk_payload, ingest_door_readings, bulk_status_code, MAX_BULK_READINGS
 from flask import jsonify, request
 import time
 from prediction import prediction_bp
-from zone_rfid import zonerfid_bp
+from zone_rfid import zonerfid_bp, process_zone_line
+from rfid_supervisor import rfid_supervisor, is_local_port, ROLE_DOOR, ROLE_ZONE, READER_ROLES
+from read_cache import recent_door_reads, DOOR_DEDUP_WINDOW
+from door_scans import pending_door_scans, reconcile_expired_door_scans
+from inventory_service import add_occupied_slots, remove_product_inventory
+from sales_rollup import record_order_created, record_order_updated, record_order_deleted, remove_product_sales
 
 # Importation du nouveau blueprint des étagères
 from shelves import shelves_bp
@@ -39,6 +54,12 @@ jwt = JWTManager(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://root@localhost/stock_genius'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = True
 app.config['SECRET_KEY'] = 'KEY00155'  # Important pour la sécurité
+# Alertes de stock et de commandes réévaluées en plus à chaque écriture (le balayage périodique est conservé)
+app.config['ALERTS_EVENT_DRIVEN'] = True
+# Exécuter les règles d'alertes en parallèle (une session par règle)
+app.config['ALERTS_PARALLEL_RULES'] = False
+# Processus d'ajustement des prévisions (None : un par cœur, utilisé à partir de 2000 produits)
+app.config['FORECAST_WORKERS'] = None
 
 # Initialisation de la base de données avec l'application
 db.init_app(app)
@@ -362,7 +383,12 @@ def create_order():
         user_id=user_id
     )
     db.session.add(new_order)
+    db.session.flush()
+    record_order_created(new_order)
     db.session.commit()
+    alert_events.enqueue(new_order.product_id)
+    prediction_indicators.invalidate()
+    clear_seasonal_profiles(new_order.created_at.year)
     return jsonify({'message': 'Commande créée avec succès', 'order_id': new_order.id}), 201
 # UPDATE an order
 @app.route('/api/orders/<int:order_id>', methods=['PUT'])
@@ -373,12 +399,17 @@ def update_order(order_id):
         return jsonify({'error': 'Commande non trouvée'}), 404
 
     data = request.get_json()
+    previous_quantity = order.quantity
     order.status = data.get('status', order.status)
     order.quantity = data.get('quantity', order.quantity)
     order.delivered_at = data.get('delivered_at', order.delivered_at)
     order.returned_at = data.get('returned_at', order.returned_at)
     # Tu peux aussi permettre de changer product_id ou customer_id si besoin
+    record_order_updated(order, previous_quantity)
     db.session.commit()
+    alert_events.enqueue(order.product_id)
+    prediction_indicators.invalidate()
+    clear_seasonal_profiles(order.created_at.year)
     return jsonify({'message': 'Commande mise à jour avec succès'}), 200
 
 
@@ -391,8 +422,14 @@ def delete_order(order_id):
         return jsonify({'error': 'Commande non trouvée'}), 404
 
     try:
+        record_order_deleted(order)
+        order_year = order.created_at.year
+        product_id = order.product_id
         db.session.delete(order)
         db.session.commit()
+        alert_events.enqueue(product_id)
+        prediction_indicators.invalidate()
+        clear_seasonal_profiles(order_year)
         return jsonify({'message': 'Commande supprimée avec succès'}), 200
     except Exception as e:
         db.session.rollback()
@@ -567,8 +604,10 @@ def delete_product(product_id):
     
     try:
         # Supprimer d'abord les enregistrements associés
-        inv_count = Inventory.query.filter_by(product_id=product_id).delete()
+        inv_count = remove_product_inventory(product_id)  # Libère aussi les emplacements des zones
+        remove_product_forecasts(product_id)
         order_count = Order.query.filter_by(product_id=product_id).delete()
+        remove_product_sales(product_id)
         alert_count = Alert.query.filter_by(product_id=product_id).delete()
         
         print(f"✅ Supprimé: {inv_count} inventaires, {order_count} commandes, {alert_count} alertes")
@@ -579,6 +618,9 @@ def delete_product(product_id):
         # Supprimer le produit
         db.session.delete(product)
         db.session.commit()
+        active_alerts.discard_product(product_id)
+        prediction_indicators.invalidate()
+        clear_seasonal_profiles()
         
         # Vérification post-suppression
         check_product = db.session.get(Product, product_id)
@@ -621,6 +663,8 @@ def update_product(product_id):
     
     # Sauvegarder les modifications dans la base de données
     db.session.commit()
+    # Les seuils déterminent les produits en alerte et à risque
+    prediction_indicators.invalidate()
     
     return jsonify({
         'message': 'Produit mis à jour avec succès',
@@ -643,7 +687,11 @@ def get_zones():
         zone_data = {
             'id': zone.id,
             'name': zone.name,
-            'description': zone.description
+            'description': zone.description,
+            'min_threshold': zone.min_threshold,
+            'max_threshold': zone.max_threshold,
+            'capacity': zone.capacity,
+            'occupied_slots': zone.occupied_slots
         }
         result.append(zone_data)
     return jsonify(result)
@@ -654,7 +702,10 @@ def create_zone():
     
     new_zone = Zone(
         name=data['name'],
-        description=data.get('description')
+        description=data.get('description'),
+        min_threshold=data.get('min_threshold'),
+        max_threshold=data.get('max_threshold'),
+        capacity=data.get('capacity', DEFAULT_ZONE_CAPACITY)
     )
     
     db.session.add(new_zone)
@@ -665,10 +716,49 @@ def create_zone():
         'zone': {
             'id': new_zone.id,
             'name': new_zone.name,
-            'description': new_zone.description
+            'description': new_zone.description,
+            'min_threshold': new_zone.min_threshold,
+            'max_threshold': new_zone.max_threshold,
+            'capacity': new_zone.capacity,
+            'occupied_slots': new_zone.occupied_slots
         }
     }), 201
 
+#Modifier une zone (nom, description, seuils de quantité, capacité)
+@app.route('/api/zones/<int:zone_id>', methods=['PUT'])
+@jwt_required()
+def update_zone(zone_id):
+    zone = db.session.get(Zone, zone_id)
+    if not zone:
+        return jsonify({'error': 'Zone non trouvée'}), 404
+    
+    data = request.get_json() or {}
+    min_threshold = data.get('min_threshold', zone.min_threshold)
+    max_threshold = data.get('max_threshold', zone.max_threshold)
+    if min_threshold is not None and max_threshold is not None and min_threshold > max_threshold:
+        return jsonify({'error': 'Le seuil minimal doit être inférieur ou égal au seuil maximal'}), 400
+    
+    zone.name = data.get('name', zone.name)
+    zone.description = data.get('description', zone.description)
+    # null rétablit les seuils par défaut des alertes d'optimisation du stockage
+    zone.min_threshold = min_threshold
+    zone.max_threshold = max_threshold
+    zone.capacity = data.get('capacity', zone.capacity)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Zone mise à jour avec succès',
+        'zone': {
+            'id': zone.id,
+            'name': zone.name,
+            'description': zone.description,
+            'min_threshold': zone.min_threshold,
+            'max_threshold': zone.max_threshold,
+            'capacity': zone.capacity,
+            'occupied_slots': zone.occupied_slots
+        }
+    }), 200
+
 # Routes pour l'inventaire
 @app.route('/api/inventory', methods=['GET'])
 def get_inventory():
@@ -709,6 +799,8 @@ def create_inventory():
         existing_inventory.quantity = data['quantity']
         existing_inventory.last_update_at = datetime.utcnow()
         db.session.commit()
+        alert_events.enqueue(existing_inventory.product_id)
+        prediction_indicators.invalidate()
         return jsonify({
             'message': 'Inventaire mis à jour avec succès',
             'inventory': {
@@ -726,7 +818,10 @@ def create_inventory():
         )
         
         db.session.add(new_inventory)
+        add_occupied_slots(new_inventory.zone_id, 1)
         db.session.commit()
+        alert_events.enqueue(new_inventory.product_id)
+        prediction_indicators.invalidate()
         
         return jsonify({
             'message': 'Inventaire créé avec succès',
@@ -875,6 +970,8 @@ def resolve_alert(alert_id):
     
     # Enregistrer les modifications
     db.session.commit()
+    # L'alerte n'est plus active : une nouvelle alerte du même type pourra être générée
+    active_alerts.discard(alert.product_id, alert.type)
     
     return jsonify({
         'message': 'Alerte résolue avec succès',
@@ -884,34 +981,102 @@ def resolve_alert(alert_id):
             'status': alert.status
         }
     }), 200
+# Route pour consulter les mesures du dernier cycle de génération d'alertes
+@app.route('/api/alerts/metrics', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_alert_metrics():
+    """
+    Durée, requêtes SQL, lignes lues et alertes créées par règle lors du dernier cycle
+    """
+    if alert_metrics.last_run is None:
+        return jsonify({'message': 'Aucun cycle de génération exécuté depuis le démarrage'}), 200
+    return jsonify(alert_metrics.last_run), 200
+
+# Route pour consulter l'efficacité du cache des indicateurs de prédiction
+@app.route('/api/prediction/indicators/metrics', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_prediction_indicators_metrics():
+    """
+    Succès et échecs du cache de /api/prediction/indicators, invalidations et durée du dernier calcul
+    """
+    return jsonify(prediction_indicators.stats()), 200
+
+# Route pour consulter le leader du scheduler et la dernière exécution
+@app.route('/api/alerts/scheduler', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_alert_scheduler_status():
+    """
+    Processus leader, expiration du bail, durée et résultat de la dernière génération
+    """
+    return jsonify(get_scheduler_status(ALERTS_JOB_NAME)), 200
+
 # 👇 Démarrer le scheduler
+ALERTS_JOB_NAME = 'generate_alerts'
+# Balayage complet toutes les 7 minutes, mode événementiel ou non : les règles capteurs, saisonnières,
+# tendance et optimisation du stockage ne sont pas réévaluées par les événements d'écriture
+ALERTS_INTERVAL_MINUTES = 7
+# Une exécution par intervalle tous processus confondus, même si leurs déclenchements sont décalés
+ALERTS_MIN_INTERVAL = timedelta(minutes=ALERTS_INTERVAL_MINUTES / 2)
+# Réconciliation des scans de porte non rangés, exécutée par le processus leader
+DOOR_SCANS_JOB_NAME = 'reconcile_door_scans'
+DOOR_SCANS_RECONCILE_MINUTES = 5
+DOOR_SCANS_MIN_INTERVAL = timedelta(minutes=DOOR_SCANS_RECONCILE_MINUTES / 2)
+# Prévisions de commandes recalculées chaque nuit par le processus leader
+FORECAST_JOB_NAME = 'generate_forecasts'
+FORECAST_HOUR = 2
+# Une seule exécution par nuit tous processus confondus
+FORECAST_MIN_INTERVAL = timedelta(hours=12)
+
 def start_scheduler():
+    # Verrous de leader : table absente sur une base créée avant son ajout (voir migrate_scheduler_locks.py)
+    with app.app_context():
+        ensure_lock_table()
     scheduler = BackgroundScheduler()
-    scheduler.add_job(func=generate_alerts_job, trigger="interval", minutes=7)#minutes
+    # Une seule instance à la fois ; les déclenchements manqués sont regroupés en un seul
+    scheduler.add_job(func=generate_alerts_job, trigger="interval", minutes=ALERTS_INTERVAL_MINUTES,
+                      max_instances=1, coalesce=True)
+    # Scans de porte non rangés dans le délai (tous processus, lus en base)
+    scheduler.add_job(func=reconcile_door_scans_job, trigger="interval", minutes=DOOR_SCANS_RECONCILE_MINUTES,
+                      max_instances=1, coalesce=True)
+    # Prévisions journalière, hebdomadaire et mensuelle de tous les produits
+    scheduler.add_job(func=generate_forecasts_job, trigger="cron", hour=FORECAST_HOUR,
+                      max_instances=1, coalesce=True)
     scheduler.start()
 
+def reconcile_door_scans_job():
+    with app.app_context():
+        # Un seul processus à la fois : les autres trouveraient les mêmes scans en base
+        run_as_leader(DOOR_SCANS_JOB_NAME, reconcile_expired_door_scans, DOOR_SCANS_MIN_INTERVAL)
+
+def generate_forecasts_job():
+    with app.app_context():
+        if run_as_leader(FORECAST_JOB_NAME, generate_forecasts, FORECAST_MIN_INTERVAL) == "ok":
+            prediction_indicators.invalidate()
+            print("✅ Prévisions de commandes recalculées")
+
 # 👇 Wrapper pour exécuter les alertes dans le contexte Flask
 def generate_alerts_job():
     with app.app_context():
-        generate_all_alerts()
-        print("✅ Alertes générées automatiquement")
+        # Seul le processus leader génère les alertes
+        outcome = run_as_leader(ALERTS_JOB_NAME, generate_all_alerts, ALERTS_MIN_INTERVAL)
+        if outcome == "ok":
+            print("✅ Alertes générées automatiquement")
    
 #CODE ARDUINO /////////////////////////////////////////////////////////////////////
 # Configuration du port série Arduino (à ajuster selon votre configuration)
 SERIAL_PORT = 'COM4'  # Changez selon votre port Arduino
 BAUD_RATE = 9600
-arduino_serial = None
+# Lecteur de la porte déclaré par défaut si aucun n'est configuré
+DEFAULT_DOOR_READER = 'door'
 
-# Fonction pour initialiser la connexion série avec Arduino
-def init_arduino_serial():
-    global arduino_serial
-    try:
-        arduino_serial = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        print(f"✅ Connexion établie avec Arduino sur {SERIAL_PORT}")
-        return True
-    except serial.SerialException as e:
-        print(f"❌ Erreur de connexion au port série: {e}")
-        return False
+def ensure_door_reader():
+    """Déclare le lecteur de la porte historique (SERIAL_PORT) si aucun lecteur de porte n'est configuré"""
+    if RFIDReader.query.filter_by(role=ROLE_DOOR).first() is None:
+        db.session.add(RFIDReader(name=DEFAULT_DOOR_READER, port=SERIAL_PORT, baud_rate=BAUD_RATE, role=ROLE_DOOR))
+        db.session.commit()
 
 # Créer un client
 @app.route('/api/sensordata', methods=['POST'])
@@ -934,121 +1099,94 @@ def create_sensortrace():
     db.session.commit()
     return jsonify({'message': 'Client créé avec succès'}), 201
 
-# Fonction pour lire les données RFID en continu
-# Fonction pour lire les données RFID en continu
-def read_rfid_data():
-    global arduino_serial
+# Fonction pour traiter une ligne reçue du lecteur RFID de la porte
+def process_door_reading(data_str):
+    """
+    Enregistre une lecture du lecteur de la porte : nouvelle lecture, ou mise à jour du poids
+    d'une lecture du même UID dans les 5 dernières minutes.
+    """
+    # Tenter d'extraire les données JSON
+    try:
+        data_json = json.loads(data_str)
+        uid = data_json.get("uid", "")
+        # Poids en grammes (à la racine ou dans data.weight), enregistré en kg
+        weight = grams_to_kg(extract_weight(data_json))
+        logging.debug(f"Lecture porte: uid={uid}, poids={weight} kg")
+    except json.JSONDecodeError as json_err:
+        logging.warning(f"⚠️ Erreur de décodage JSON: {json_err}")
+        uid = data_str
+        weight = None
     
-    while True:
-        try:
-            if arduino_serial and arduino_serial.is_open and arduino_serial.in_waiting:
-                # Lire une ligne depuis Arduino
-                data_str = arduino_serial.readline().decode('utf-8').strip()
-                
-                # Ignorer les lignes vides
-                if not data_str:
-                    continue
-                
-                print(f"📡 Données reçues brutes: '{data_str}'")
-                
-                try:
-                    import json
-                    
-                    # Tenter d'extraire les données JSON
-                    try:
-                        data_json = json.loads(data_str)
-                        uid = data_json.get("uid", "")
-                        
-                        # Débogage détaillé des données reçues
-                        print(f"🔍 Structure JSON complète: {json.dumps(data_json, indent=2)}")
-                        
-                        # Extraire et vérifier le poids explicitement
-                        raw_weight = None
-                        if "weight" in data_json:
-                            raw_weight = data_json["weight"]
-                            print(f"🔍 Poids trouvé directement: {raw_weight} (type: {type(raw_weight)})")
-                        elif isinstance(data_json.get("data"), dict) and "weight" in data_json["data"]:
-                            raw_weight = data_json["data"]["weight"]
-                            print(f"🔍 Poids trouvé dans data: {raw_weight} (type: {type(raw_weight)})")
-                        
-                        # Essayer de convertir le poids en float si c'est une chaîne
-                        weight = None
-                        if raw_weight is not None:
-                            try:
-                                weight_grams = raw_weight
-                                weight = round(weight_grams / 1000, 3)
-                                print(f"✅ Poids converti de {weight_grams}g à {weight}kg")
-                                print(f"✅ Poids converti avec succès: {weight}")
-                            except (ValueError, TypeError):
-                                print(f"⚠️ Impossible de convertir le poids en nombre: {raw_weight}")
-                        
-                    except json.JSONDecodeError as json_err:
-                        print(f"⚠️ Erreur de décodage JSON: {json_err}")
-                        uid = data_str
-                        weight = None
-                    
-                    # Traiter les données dans le contexte de l'application
-                    with app.app_context():
-                        # Vérifier si une entrée similaire existe dans les 5 dernières minutes
-                        five_min_ago = datetime.utcnow() - timedelta(minutes=5)
-                        
-                        # Rechercher un enregistrement récent avec le même uid
-                        existing_record = SensorData.query.filter(
-                            SensorData.value.like(f"%{uid}%"),
-                            SensorData.saved_at >= five_min_ago
-                        ).order_by(SensorData.saved_at.desc()).first()
-                        
-                        if existing_record and uid:  # Vérifier que uid n'est pas vide
-                            # Afficher l'enregistrement existant pour débogage
-                            print(f"🔍 Enregistrement existant trouvé: ID={existing_record.id}, Valeur={existing_record.value}")
-                            
-                            # Mettre à jour uniquement le poids de l'enregistrement existant
-                            try:
-                                existing_data = json.loads(existing_record.value)
-                                
-                                # Sauvegarder l'ancien poids pour comparaison
-                                old_weight = None
-                                if "weight" in existing_data:
-                                    old_weight = existing_data["weight"]
-                                elif isinstance(existing_data.get("data"), dict) and "weight" in existing_data["data"]:
-                                    old_weight = existing_data["data"]["weight"]
-                                
-                                # Mettre à jour le poids seulement s'il est différent
-                                if weight is not None and weight != old_weight:
-                                    # Mettre à jour selon la structure
-                                    if "weight" in existing_data:
-                                        existing_data["weight"] = weight
-                                    elif isinstance(existing_data.get("data"), dict):
-                                        existing_data["data"]["weight"] = weight
-                                    
-                                    # Sauvegarder les données mises à jour
-                                    existing_record.value = json.dumps(existing_data)[:255]
-                                    db.session.commit()
-                                    print(f"✅ Poids mis à jour: {old_weight} -> {weight} pour l'ID: {existing_record.id}")
-                                else:
-                                    print(f"ℹ️ Pas de mise à jour nécessaire, poids inchangé: {weight}")
-                            except Exception as update_err:
-                                print(f"❌ Erreur lors de la mise à jour: {update_err}")
-                        else:
-                            # Créer un nouvel enregistrement
-                            new_sensor_data = SensorData(
-                                value=data_str[:255],  # Limiter à 255 caractères
-                                stored=False
-                            )
-                            db.session.add(new_sensor_data)
-                            db.session.commit()
-                            print(f"✅ Nouvel enregistrement créé avec succès! ID: {new_sensor_data.id}")
-                except Exception as e:
-                    import traceback
-                    traceback.print_exc()
-                    db.session.rollback()
-                    print(f"❌ Erreur de traitement des données: {e}")
+    uid = normalize_uid(uid)
+    
+    # Traiter les données dans le contexte de l'application
+    with app.app_context():
+        now = datetime.utcnow()
+        
+        # Lecture répétée d'un UID vu dans les 5 dernières minutes : servie par le cache, sans requête
+        recent = recent_door_reads.get(uid, now) if uid else None
+        if recent is None and uid:
+            # Première lecture pour ce processus : rechercher un enregistrement récent (index uid, saved_at)
+            existing_record = SensorData.query.filter(
+                SensorData.uid == uid,
+                SensorData.saved_at >= now - DOOR_DEDUP_WINDOW
+            ).order_by(SensorData.saved_at.desc()).first()
+            if existing_record:
+                logging.debug(f"Enregistrement existant trouvé: ID={existing_record.id}")
+                recent = recent_door_reads.put(uid, existing_record.id, existing_record.weight,
+                                               existing_record.value, existing_record.saved_at)
+        
+        if recent:
+            # Mettre à jour uniquement le poids de l'enregistrement existant
+            old_weight = recent.weight
+            if weight is None or weight == old_weight:
+                logging.debug(f"Poids inchangé pour {uid}: {weight}")
+                return
             
-            time.sleep(0.1)  # Pause pour éviter une utilisation CPU excessive
+            # Garder la trame brute cohérente avec le poids enregistré
+            value = frame_with_weight(recent.value, weight)
             
-        except Exception as e:
-            print(f"❌ Erreur lors de la lecture RFID: {e}")
-            time.sleep(1)  # Attendre avant de réessayer
+            # Mise à jour par id, sans recharger l'enregistrement
+            updated = SensorData.query.filter_by(id=recent.record_id).update(
+                {'weight': weight, 'value': value}, synchronize_session=False
+            )
+            db.session.commit()
+            if updated:
+                recent_door_reads.update(uid, weight, value)
+                pending_door_scans.update_weight(uid, recent.record_id, weight)
+                logging.debug(f"Poids mis à jour: {old_weight} -> {weight} pour l'ID: {recent.record_id}")
+                return
+            # Enregistrement supprimé entre-temps : repartir d'une nouvelle lecture
+            recent_door_reads.discard(uid)
+        
+        # Créer un nouvel enregistrement
+        new_sensor_data = SensorData(
+            value=data_str[:255],  # Limiter à 255 caractères
+            saved_at=now,
+            stored=False,
+            uid=uid,
+            weight=weight,
+            source=SOURCE_DOOR
+        )
+        db.session.add(new_sensor_data)
+        db.session.commit()
+        if uid:
+            recent_door_reads.put(uid, new_sensor_data.id, weight, new_sensor_data.value, now)
+            # Scan en attente de rangement en zone
+            pending_door_scans.add(uid, new_sensor_data.id, weight, now)
+        logging.debug(f"Nouvel enregistrement créé: ID={new_sensor_data.id}")
+
+# Traitement des lignes des lecteurs de porte supervisés (rfid_supervisor.py)
+def handle_door_line(data_str, reader):
+    """Ligne reçue d'un lecteur de porte ; exécutée dans le contexte de l'application par le superviseur"""
+    logging.debug(f"Données reçues ({reader['name']}): {data_str}")
+    process_door_reading(data_str)
+
+# Traitement des lignes selon le rôle du lecteur
+rfid_supervisor.init_app(app, {
+    ROLE_DOOR: handle_door_line,
+    ROLE_ZONE: process_zone_line
+})
 
 # Fonction auxiliaire pour mettre à jour un produit avec les données RFID
 def update_product_with_rfid_data(product_id, card_data, uid):
@@ -1119,35 +1257,100 @@ def process_rfid_data(data):
 @jwt_required()
 @role_required(['admin'])  # Limiter aux administrateurs
 def start_rfid_reader():
-    """Démarrer la lecture RFID"""
-    global arduino_serial
+    """Démarrer les lecteurs RFID de la porte"""
+    ensure_door_reader()
+    readers = RFIDReader.query.filter_by(role=ROLE_DOOR).all()
+    started = [reader.name for reader in readers if is_local_port(reader.port) and rfid_supervisor.start(reader)]
     
-    if arduino_serial and arduino_serial.is_open:
+    if not started:
         return jsonify({"message": "Le lecteur RFID est déjà démarré"}), 200
-    
-    if init_arduino_serial():
-        # Démarrer le thread de lecture RFID
-        rfid_thread = threading.Thread(target=read_rfid_data, daemon=True)
-        rfid_thread.start()
-        return jsonify({"message": "Lecteur RFID démarré avec succès"}), 200
-    else:
-        return jsonify({"error": "Impossible de se connecter au lecteur RFID"}), 500
+    return jsonify({"message": "Lecteur RFID démarré avec succès", "readers": started}), 200
 
 # Route pour arrêter la lecture RFID
 @app.route('/api/rfid/stop', methods=['POST'])
 @jwt_required()
 @role_required(['admin'])  # Limiter aux administrateurs
 def stop_rfid_reader():
-    """Arrêter la lecture RFID"""
-    global arduino_serial
+    """Arrêter les lecteurs RFID de la porte"""
+    readers = RFIDReader.query.filter_by(role=ROLE_DOOR).all()
+    stopped = [reader.name for reader in readers if rfid_supervisor.stop(reader.name)]
     
-    if arduino_serial and arduino_serial.is_open:
-        arduino_serial.close()
-        arduino_serial = None
-        return jsonify({"message": "Lecteur RFID arrêté avec succès"}), 200
+    if stopped:
+        return jsonify({"message": "Lecteur RFID arrêté avec succès", "readers": stopped}), 200
     else:
         return jsonify({"message": "Le lecteur RFID n'était pas démarré"}), 200
 
+# Routes de gestion des lecteurs RFID supervisés
+@app.route('/api/rfid/readers', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_rfid_readers():
+    """Configuration et état de santé de tous les lecteurs"""
+    readers = RFIDReader.query.order_by(RFIDReader.id).all()
+    return jsonify([rfid_supervisor.status(reader) for reader in readers]), 200
+
+@app.route('/api/rfid/readers', methods=['POST'])
+@jwt_required()
+@role_required(['admin'])
+def create_rfid_reader():
+    """Déclarer un lecteur (nom, port, rôle door/zone, zone surveillée)"""
+    data = request.get_json() or {}
+    if not data.get('name') or not data.get('port'):
+        return jsonify({'error': 'Le nom et le port sont obligatoires'}), 400
+    if data.get('role') not in READER_ROLES:
+        return jsonify({'error': f"Le rôle doit être l'un de : {', '.join(READER_ROLES)}"}), 400
+    if not is_local_port(data['port']):
+        return jsonify({'error': "Le port doit être un port série local (COM4, /dev/ttyUSB0), pas une URL"}), 400
+    if RFIDReader.query.filter_by(name=data['name']).first():
+        return jsonify({'error': 'Un lecteur avec ce nom existe déjà'}), 409
+    
+    reader = RFIDReader(
+        name=data['name'],
+        port=data['port'],
+        baud_rate=data.get('baud_rate', BAUD_RATE),
+        role=data['role'],
+        zone_id=data.get('zone_id'),
+        enabled=data.get('enabled', True)
+    )
+    db.session.add(reader)
+    db.session.commit()
+    return jsonify({'message': 'Lecteur créé avec succès', 'reader': rfid_supervisor.status(reader)}), 201
+
+@app.route('/api/rfid/readers/<string:name>/status', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_rfid_reader_status(name):
+    reader = RFIDReader.query.filter_by(name=name).first()
+    if not reader:
+        return jsonify({'error': 'Lecteur non trouvé'}), 404
+    return jsonify(rfid_supervisor.status(reader)), 200
+
+@app.route('/api/rfid/readers/<string:name>/start', methods=['POST'])
+@jwt_required()
+@role_required(['admin'])
+def start_rfid_reader_by_name(name):
+    reader = RFIDReader.query.filter_by(name=name).first()
+    if not reader:
+        return jsonify({'error': 'Lecteur non trouvé'}), 404
+    try:
+        started = rfid_supervisor.start(reader)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not started:
+        return jsonify({'message': f'Le lecteur {name} est déjà démarré', 'reader': rfid_supervisor.status(reader)}), 200
+    return jsonify({'message': f'Lecteur {name} démarré', 'reader': rfid_supervisor.status(reader)}), 200
+
+@app.route('/api/rfid/readers/<string:name>/stop', methods=['POST'])
+@jwt_required()
+@role_required(['admin'])
+def stop_rfid_reader_by_name(name):
+    reader = RFIDReader.query.filter_by(name=name).first()
+    if not reader:
+        return jsonify({'error': 'Lecteur non trouvé'}), 404
+    if not rfid_supervisor.stop(name):
+        return jsonify({'message': f"Le lecteur {name} n'était pas démarré"}), 200
+    return jsonify({'message': f'Lecteur {name} arrêté', 'reader': rfid_supervisor.status(reader)}), 200
+
 # Route pour obtenir les dernières lectures RFID
 @app.route('/api/rfid/readings', methods=['GET'])
 @jwt_required()
@@ -1255,35 +1458,46 @@ def receive_rfid_data():
         
         if not data:
             return jsonify({"error": "Données JSON manquantes"}), 400
-            
-        # Extraire les informations
-        uid = data.get('uid')
-        weight = data.get('weight', 0)
-        card_data = data.get('data', '')
-        
-        # Se connecter à la base de données
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        
-        # Enregistrer les données
-        query = """
-        INSERT INTO sensor_data (sensor_id, value, weight, timestamp) 
-        VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(query, (1, card_data, weight, datetime.now()))
         
-        # Valider et fermer la connexion
-        conn.commit()
-        cursor.close()
-        conn.close()
+        results, accepted = ingest_door_readings([data])
+        if not accepted:
+            return jsonify({"error": results[0]['error']}), 400
         
         return jsonify({
             "message": "Données RFID enregistrées avec succès",
-            "uid": uid,
+            "uid": results[0]['uid'],
             "timestamp": datetime.now().isoformat()
         }), 201
         
     except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+# Route pour enregistrer un lot de lectures RFID (tableau JSON ou NDJSON)
+@app.route('/api/rfid/data/bulk', methods=['POST'])
+def receive_rfid_data_bulk():
+    """
+    Enregistre un lot de lectures du lecteur de la porte en une seule insertion multi-lignes
+    et renvoie le résultat de chaque lecture
+    """
+    try:
+        readings = parse_bulk_payload(request)
+        if not readings:
+            return jsonify({"error": "Aucune lecture dans la requête"}), 400
+        if len(readings) > MAX_BULK_READINGS:
+            return jsonify({"error": f"Maximum {MAX_BULK_READINGS} lectures par requête"}), 413
+        
+        results, accepted = ingest_door_readings(readings)
+        
+        return jsonify({
+            "received": len(readings),
+            "created": sum(1 for result in results if result['status'] == 'created'),
+            "errors": len(readings) - accepted,
+            "results": results
+        }), bulk_status_code(accepted, len(readings))
+        
+    except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '_main_':
@@ -1363,18 +1577,18 @@ def handle_options(path):
 
 if __name__ == '__main__':
     with app.app_context():
-        generate_all_alerts()  # Première exécution immédiate
-        start_scheduler()      # Démarrer le scheduler toutes les 7 secondes
+        start_scheduler()      # Démarrer le scheduler (crée aussi la table scheduler_locks si besoin)
+        generate_alerts_job()  # Première exécution immédiate (si ce processus est le leader)
+        if app.config['ALERTS_EVENT_DRIVEN']:
+            alert_events.start(app)  # Réévaluation des produits modifiés
         
         # Initialiser les lecteurs RFID
         try:
-            # Lecteur RFID d'entrée
-            if init_arduino_serial():
-                rfid_thread = threading.Thread(target=read_rfid_data, daemon=True)
-                rfid_thread.start()
-                print("✅ Lecteur RFID d'entrée démarré")
-                
-            # Nous ne démarrons pas automatiquement le lecteur de zone - il sera démarré via l'API
+            # Lecteurs activés dans rfid_readers (le lecteur d'entrée est déclaré par défaut) ;
+            # les autres sont démarrés via l'API
+            ensure_door_reader()
+            started = rfid_supervisor.start_all()
+            print(f"✅ Lecteurs RFID démarrés: {', '.join(started) or 'aucun'}")
         except Exception as e:
             print(f"❌ Erreur d'initialisation RFID: {e}")
             
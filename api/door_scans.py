@@ -0,0 +1,244 @@
+# door_scans.py
+from datetime import datetime, timedelta
+import logging
+import threading
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from models import db, SensorData, Product, Alert
+from alert_index import active_alerts
+from readings import SOURCE_DOOR
+
+# Délai de rangement d'un produit scanné à la porte
+PENDING_SCAN_TTL = timedelta(minutes=30)
+# Alerte des produits scannés à la porte et jamais rangés
+UNSTORED_SCAN_ALERT = "scan_porte_non_rangé"
+# Ancienneté maximale des scans non rangés recherchés en base par reconcile_expired_door_scans()
+UNSTORED_SCAN_LOOKBACK = timedelta(days=1)
+
+
+class PendingScan:
+    """Scan de porte en attente de rangement (enregistrement SensorData stored=False)"""
+    __slots__ = ('record_id', 'uid', 'weight', 'saved_at')
+
+    def __init__(self, record_id, uid, weight, saved_at):
+        self.record_id = record_id
+        self.uid = uid
+        self.weight = weight
+        self.saved_at = saved_at
+
+
+class PendingDoorScanIndex:
+    """
+    Index en mémoire des scans de porte en attente, par UID (du plus ancien au plus récent) :
+    le rapprochement d'un scan en zone ne parcourt que les scans de son UID.
+    - Alimenté à l'enregistrement des lectures de la porte (process_door_reading) ; un UID absent
+      est rechargé depuis la base (lectures d'un autre processus ou de l'endpoint groupé).
+    - Les scans réservés par claim_door_scan() sont retirés après le commit de la réservation.
+    - Les scans dépassant PENDING_SCAN_TTL sont retirés ; les alertes de scans non rangés
+      sont calculées depuis la base (reconcile_expired_door_scans()), pas depuis l'index.
+    """
+
+    def __init__(self, ttl=PENDING_SCAN_TTL):
+        self.ttl = ttl
+        self._by_uid = {}
+        self._lock = threading.Lock()
+
+    def add(self, uid, record_id, weight, saved_at):
+        with self._lock:
+            self._by_uid.setdefault(uid, []).append(PendingScan(record_id, uid, weight, saved_at))
+
+    def update_weight(self, uid, record_id, weight):
+        with self._lock:
+            for scan in self._by_uid.get(uid, ()):
+                if scan.record_id == record_id:
+                    scan.weight = weight
+
+    def remove(self, uid, record_id):
+        with self._lock:
+            scans = [scan for scan in self._by_uid.get(uid, ()) if scan.record_id != record_id]
+            if scans:
+                self._by_uid[uid] = scans
+            else:
+                self._by_uid.pop(uid, None)
+
+    def invalidate(self, uid):
+        """Oublie les scans d'un UID : ils seront relus depuis la base à la prochaine recherche"""
+        with self._lock:
+            self._by_uid.pop(uid, None)
+
+    def _valid(self, scans, now):
+        cutoff = now - self.ttl
+        return [scan for scan in scans if scan.saved_at >= cutoff]
+
+    def get(self, uid, now=None):
+        """Scans en attente de l'UID encore dans le délai, ou None si l'UID n'est pas indexé"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            scans = self._by_uid.get(uid)
+            if scans is None:
+                return None
+            valid = self._valid(scans, now)
+            self._by_uid[uid] = valid
+            return list(valid)
+
+    def load(self, uid, scans):
+        """Remplace les scans indexés d'un UID (relus depuis la base)"""
+        with self._lock:
+            self._by_uid[uid] = list(scans)
+
+    def expire(self, now=None):
+        """Retire tous les scans sortis du délai"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            for uid in list(self._by_uid):
+                valid = self._valid(self._by_uid[uid], now)
+                if valid:
+                    self._by_uid[uid] = valid
+                else:
+                    del self._by_uid[uid]
+
+
+# Scans de porte en attente, partagés par le processus
+pending_door_scans = PendingDoorScanIndex()
+
+# Scans réservés dans la transaction en cours d'une session : [(transaction ou savepoint, uid, record_id)]
+CLAIMED_SCANS_KEY = 'claimed_door_scans'
+
+
+def _claimed_in_transaction(session):
+    return session.info.setdefault(CLAIMED_SCANS_KEY, [])
+
+
+def _within(transaction, ended):
+    """Vrai si `transaction` est `ended` ou l'un de ses savepoints"""
+    while transaction is not None:
+        if transaction is ended:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, 'after_commit')
+def _discard_claimed_scans(session):
+    """Transaction principale validée : les scans réservés ne sont plus en attente"""
+    if session.in_nested_transaction():
+        # Validation d'un savepoint : la transaction principale peut encore être annulée
+        return
+    for _, uid, record_id in session.info.pop(CLAIMED_SCANS_KEY, ()):
+        pending_door_scans.remove(uid, record_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _keep_claimed_scans(session, previous_transaction):
+    """
+    Réservations annulées : les scans restent indexés et en attente. Le rollback d'un savepoint
+    (lecture en échec d'un lot) n'oublie que les réservations faites dans ce savepoint.
+    """
+    claims = session.info.get(CLAIMED_SCANS_KEY)
+    if claims:
+        session.info[CLAIMED_SCANS_KEY] = [
+            claim for claim in claims if not _within(claim[0], previous_transaction)
+        ]
+
+
+def find_pending_scans(uid, now=None):
+    """Scans de porte en attente de l'UID (index, sinon une requête sur l'index uid, saved_at)"""
+    now = now or datetime.utcnow()
+    scans = pending_door_scans.get(uid, now)
+    if scans:
+        return scans
+    rows = db.session.query(SensorData.id, SensorData.weight, SensorData.saved_at).filter(
+        SensorData.uid == uid,
+        SensorData.stored == False,
+        SensorData.saved_at >= now - pending_door_scans.ttl
+    ).order_by(SensorData.saved_at).all()
+    scans = [PendingScan(row.id, uid, row.weight, row.saved_at) for row in rows]
+    pending_door_scans.load(uid, scans)
+    return scans
+
+
+def claim_door_scan(uid, product_id, matches=None, require_match=False, now=None):
+    """
+    Réserve le scan de porte en attente correspondant à un scan en zone.
+    - matches(poids porte) : tolérance de poids ; les scans dans la tolérance sont essayés en premier,
+      du plus ancien au plus récent, puis les autres sauf si require_match.
+    - La réservation est un UPDATE ... WHERE stored = false : un scan déjà réservé par une autre
+      requête (ou un autre processus) est ignoré. Elle est validée avec le commit de l'appelant,
+      qui retire alors le scan de l'index ; en cas de rollback, le scan reste en attente.
+    Retourne (scan réservé ou None, scans encore en attente pour l'UID).
+    """
+    claimed_here = _claimed_in_transaction(db.session)
+    # Scans déjà réservés dans cette transaction (lectures d'un même lot), pas encore validés
+    reserved = {record_id for _, claimed_uid, record_id in claimed_here if claimed_uid == uid}
+    scans = [scan for scan in find_pending_scans(uid, now) if scan.record_id not in reserved]
+    if matches is None:
+        ordered = scans
+    else:
+        matching = [scan for scan in scans if matches(scan.weight)]
+        ordered = matching if require_match else matching + [scan for scan in scans if scan not in matching]
+
+    tried = set()
+    for scan in ordered:
+        tried.add(scan.record_id)
+        claimed = SensorData.query.filter(
+            SensorData.id == scan.record_id,
+            SensorData.stored == False
+        ).update({'stored': True, 'product_id': product_id}, synchronize_session=False)
+        if claimed:
+            session = db.session()
+            transaction = session.get_nested_transaction() or session.get_transaction()
+            claimed_here.append((transaction, uid, scan.record_id))
+            return scan, [other for other in scans if other.record_id not in tried]
+        # Déjà réservé par une autre requête : le scan n'est plus en attente
+        pending_door_scans.remove(uid, scan.record_id)
+    return None, [other for other in scans if other.record_id not in tried]
+
+
+def reconcile_expired_door_scans(now=None):
+    """
+    Alerte sur les produits scannés à la porte et non rangés dans le délai, d'après la base
+    (stored = false et saved_at dépassé, index stored, saved_at) : les scans de tous les processus
+    sont couverts. L'index en mémoire est seulement purgé des scans expirés.
+    Un scan n'est signalé qu'une fois : les produits déjà alertés depuis le scan sont ignorés.
+    Retourne le nombre d'alertes créées.
+    """
+    now = now or datetime.utcnow()
+    pending_door_scans.expire(now)
+    cutoff = now - pending_door_scans.ttl
+
+    rows = db.session.query(SensorData.id, SensorData.uid, SensorData.saved_at).filter(
+        SensorData.stored == False,
+        SensorData.saved_at < cutoff,
+        SensorData.saved_at >= cutoff - UNSTORED_SCAN_LOOKBACK,
+        SensorData.source == SOURCE_DOOR,
+        SensorData.uid.isnot(None)
+    ).all()
+    if not rows:
+        return 0
+    products = dict(db.session.query(Product.rfid_tag, Product.id).filter(
+        Product.rfid_tag.in_({row.uid for row in rows})
+    ).all())
+    last_alerted = dict(db.session.query(Alert.product_id, func.max(Alert.created_at)).filter(
+        Alert.type == UNSTORED_SCAN_ALERT,
+        Alert.product_id.in_(set(products.values()))
+    ).group_by(Alert.product_id).all())
+
+    created = 0
+    with active_alerts.batch():
+        for row in rows:
+            product_id = products.get(row.uid)
+            if product_id is None:
+                logging.warning(f"⚠️ Scan de porte {row.id} non rangé : aucun produit avec le tag {row.uid}")
+                continue
+            alerted_at = last_alerted.get(product_id)
+            if alerted_at is not None and alerted_at >= row.saved_at:
+                continue
+            alert = active_alerts.add(
+                product_id, UNSTORED_SCAN_ALERT,
+                message=f"Produit scanné à la porte le {row.saved_at:%d/%m/%Y %H:%M} et non rangé en zone"
+            )
+            if alert is not None:
+                created += 1
+    if created:
+        logging.warning(f"⚠️ {created} produits scannés à la porte et non rangés")
+    return created
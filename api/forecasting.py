@@ -0,0 +1,257 @@
+# forecasting.py
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from models import db, Product, DailyProductSales, OrderPrediction, prediction_orders
+
+# Historique utilisé pour l'ajustement (jours complets, jusqu'à hier)
+HISTORY_DAYS = 182
+# Saisonnalité hebdomadaire
+SEASON_LENGTH = 7
+# Horizons produits à chaque exécution : période OrderPrediction -> nombre de jours
+FORECAST_HORIZONS = {'daily': 1, 'weekly': 7, 'monthly': 30}
+# Paramètres (alpha, beta, gamma) essayés pour chaque produit ; le meilleur en erreur à un jour est retenu
+PARAMETER_GRID = [
+    (alpha, beta, gamma)
+    for alpha in (0.1, 0.3, 0.5)
+    for beta in (0.01, 0.1)
+    for gamma in (0.05, 0.2)
+]
+# Amortissement de la tendance : évite d'extrapoler une pente sur tout un mois
+TREND_DAMPING = 0.9
+# En dessous de ce nombre de produits, l'ajustement reste dans le processus (démarrage du pool plus coûteux)
+PARALLEL_MIN_PRODUCTS = 2000
+
+
+def load_daily_sales(start, days):
+    """
+    Ventes journalières de tous les produits sur [start, start + days) sous forme de matrice
+    produit x jour, lues dans le cumul journalier (daily_product_sales) en deux requêtes.
+    Retourne (ids des produits, matrice float de forme (produits, jours)).
+    """
+    product_ids = np.array([product_id for (product_id,) in db.session.query(Product.id).order_by(Product.id)], dtype=np.int64)
+    sales = np.zeros((len(product_ids), days))
+    if not len(product_ids):
+        return product_ids, sales
+
+    rows = db.session.query(
+        DailyProductSales.product_id,
+        DailyProductSales.day,
+        DailyProductSales.quantity
+    ).filter(
+        DailyProductSales.day >= start,
+        DailyProductSales.day < start + timedelta(days=days)
+    ).all()
+    if not rows:
+        return product_ids, sales
+
+    product_column, day_column, quantity_column = zip(*rows)
+    product_index = np.searchsorted(product_ids, np.array(product_column, dtype=np.int64))
+    day_index = np.array([(day - start).days for day in day_column])
+    np.add.at(sales, (product_index, day_index), np.array(quantity_column, dtype=float))
+    return product_ids, sales
+
+
+def fit_holt_winters(history, season_length=SEASON_LENGTH, grid=PARAMETER_GRID, damping=TREND_DAMPING):
+    """
+    Lissage exponentiel de Holt-Winters additif (tendance amortie, saisonnalité hebdomadaire),
+    ajusté pour tous les produits à la fois : chaque pas de temps est une opération sur des tableaux
+    (combinaisons de paramètres x produits).
+    - history : matrice (produits, jours), au moins deux saisons
+    Retourne (niveau, tendance, saisonnalité (produits, saison), paramètres retenus (produits, 3)).
+    La saisonnalité est indexée par jour % season_length.
+    """
+    products, days = history.shape
+    m = season_length
+    if days < 2 * m:
+        raise ValueError(f"Historique trop court : {days} jours pour une saison de {m}")
+
+    params = np.asarray(grid, dtype=float)
+    alpha, beta, gamma = (params[:, i, None] for i in range(3))
+    shape = (len(params), products)
+
+    # Initialisation sur les deux premières saisons
+    first = history[:, :m].mean(axis=1)
+    second = history[:, m:2 * m].mean(axis=1)
+    level = np.broadcast_to(first, shape).copy()
+    trend = np.broadcast_to((second - first) / m, shape).copy()
+    season = np.broadcast_to(history[:, :m] - first[:, None], shape + (m,)).copy()
+    sse = np.zeros(shape)
+
+    for t in range(m, days):
+        observed = history[:, t]
+        seasonal = season[:, :, t % m]
+        damped_trend = damping * trend
+        sse += (observed - (level + damped_trend + seasonal)) ** 2
+        new_level = alpha * (observed - seasonal) + (1 - alpha) * (level + damped_trend)
+        trend = beta * (new_level - level) + (1 - beta) * damped_trend
+        season[:, :, t % m] = gamma * (observed - new_level) + (1 - gamma) * seasonal
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    index = np.arange(products)
+    return level[best, index], trend[best, index], season[best, index], params[best]
+
+
+def forecast_holt_winters(level, trend, season, start_day, horizon, damping=TREND_DAMPING):
+    """
+    Prévisions journalières (produits, horizon) à partir de l'état ajusté, pour les jours
+    start_day .. start_day + horizon - 1 de la série. Les ventes prévues ne sont jamais négatives.
+    """
+    m = season.shape[1]
+    steps = np.arange(1, horizon + 1)
+    # Somme des amortissements phi + phi² + ... + phi^h
+    damped_steps = np.cumsum(damping ** steps)
+    seasonal = season[:, (start_day + steps - 1) % m]
+    return np.maximum(level[:, None] + damped_steps * trend[:, None] + seasonal, 0)
+
+
+def fit_and_forecast(history, horizon):
+    """Prévisions journalières (produits, horizon) des jours qui suivent l'historique"""
+    level, trend, season, _ = fit_holt_winters(history)
+    return forecast_holt_winters(level, trend, season, history.shape[1], horizon)
+
+
+def _forecast_shard(shm_name, shape, start, stop, horizon):
+    """
+    Tâche d'un processus du pool : ajuste les produits [start, stop) en lisant l'historique
+    directement dans la mémoire partagée (aucune copie de la matrice transmise au processus).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        history = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        return start, fit_and_forecast(history[start:stop], horizon)
+    finally:
+        shm.close()
+
+
+def parallel_fit_and_forecast(history, horizon, workers):
+    """
+    fit_and_forecast() réparti sur `workers` processus : la matrice d'historique est copiée une fois
+    en mémoire partagée, chaque processus ajuste une tranche de produits et renvoie ses prévisions,
+    rassemblées dans une seule matrice (produits, horizon) pour l'écriture groupée.
+    Les produits sont indépendants : le résultat est identique à l'ajustement dans un seul processus.
+    """
+    history = np.ascontiguousarray(history, dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(history.nbytes, 1))
+    try:
+        np.ndarray(history.shape, dtype=np.float64, buffer=shm.buf)[:] = history
+        bounds = np.linspace(0, history.shape[0], workers + 1, dtype=int)
+        forecasts = np.empty((history.shape[0], horizon))
+        # spawn : le processus web a des threads et des connexions ouvertes, un fork les dupliquerait
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(_forecast_shard, shm.name, history.shape, int(start), int(stop), horizon)
+                for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+            ]
+            for future in futures:
+                start, shard = future.result()
+                forecasts[start:start + len(shard)] = shard
+        return forecasts
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def store_forecasts(product_ids, daily_forecast, start, now=None):
+    """
+    Enregistre les prévisions de chaque horizon (somme des prévisions journalières) par une insertion
+    multi-lignes par horizon. Les prévisions déjà calculées pour la même date de début sont remplacées,
+    avec leurs liens vers des commandes (prediction_orders).
+    Retourne le nombre de lignes insérées (sans commit).
+    """
+    now = now or datetime.utcnow()
+    start_at = datetime.combine(start, datetime.min.time())
+    inserted = 0
+    for period, horizon in FORECAST_HORIZONS.items():
+        replaced = OrderPrediction.query.filter(
+            OrderPrediction.prediction_period == period,
+            OrderPrediction.start_prediction == start_at
+        )
+        replaced_ids = replaced.with_entities(OrderPrediction.id).scalar_subquery()
+        db.session.execute(prediction_orders.delete().where(prediction_orders.c.prediction_id.in_(replaced_ids)))
+        replaced.delete(synchronize_session=False)
+        totals = daily_forecast[:, :horizon].sum(axis=1).round(2)
+        rows = [
+            {
+                'product_id': int(product_id),
+                'predicted_quantity': float(total),
+                'prediction_period': period,
+                'created_at': now,
+                'start_prediction': start_at,
+                'finish_prediction': start_at + timedelta(days=horizon)
+            }
+            for product_id, total in zip(product_ids, totals)
+        ]
+        if rows:
+            db.session.execute(OrderPrediction.__table__.insert(), rows)
+            inserted += len(rows)
+    return inserted
+
+
+def generate_forecasts(now=None, workers=None):
+    """
+    Tâche quotidienne : ajuste un modèle par produit sur l'historique des commandes et écrit les
+    prévisions journalière, hebdomadaire et mensuelle à partir d'aujourd'hui.
+    - workers : nombre de processus d'ajustement (par défaut : configuration FORECAST_WORKERS,
+      sinon un par cœur). Chaque processus ajuste au moins PARALLEL_MIN_PRODUCTS produits : les petits
+      catalogues restent dans le processus.
+    Retourne le nombre de prévisions enregistrées.
+    """
+    if workers is None:
+        workers = current_app.config.get('FORECAST_WORKERS') or os.cpu_count() or 1
+    now = now or datetime.utcnow()
+    today = now.date()
+    start = today - timedelta(days=HISTORY_DAYS)
+    product_ids, history = load_daily_sales(start, HISTORY_DAYS)
+    if not len(product_ids):
+        return 0
+
+    horizon = max(FORECAST_HORIZONS.values())
+    workers = min(workers, len(product_ids) // PARALLEL_MIN_PRODUCTS or 1)
+    if workers > 1:
+        daily_forecast = parallel_fit_and_forecast(history, horizon, workers)
+    else:
+        daily_forecast = fit_and_forecast(history, horizon)
+    inserted = store_forecasts(product_ids, daily_forecast, today, now)
+    db.session.commit()
+    logging.info(f"📈 {inserted} prévisions enregistrées pour {len(product_ids)} produits ({workers} processus)")
+    return inserted
+
+
+def get_latest_forecasts(product_ids=None):
+    """
+    Dernière prévision enregistrée de chaque produit et de chaque période, en une requête.
+    Retourne {product_id: {période: OrderPrediction}}.
+    """
+    latest = db.session.query(
+        func.max(OrderPrediction.id).label('id')
+    ).group_by(OrderPrediction.product_id, OrderPrediction.prediction_period)
+    if product_ids is not None:
+        latest = latest.filter(OrderPrediction.product_id.in_(product_ids))
+
+    forecasts = {}
+    for prediction in OrderPrediction.query.filter(OrderPrediction.id.in_(latest.subquery().select())):
+        forecasts.setdefault(prediction.product_id, {})[prediction.prediction_period] = prediction
+    return forecasts
+
+
+
+def remove_product_forecasts(product_id):
+    """Supprime les prévisions d'un produit et leurs liens avec des commandes (suppression du produit)"""
+    prediction_ids = db.session.query(OrderPrediction.id).filter_by(product_id=product_id).scalar_subquery()
+    db.session.execute(prediction_orders.delete().where(prediction_orders.c.prediction_id.in_(prediction_ids)))
+    return OrderPrediction.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+
+
+if __name__ == '__main__':
+    # Exécution manuelle : python forecasting.py
+    from app import app
+    with app.app_context():
+        print(f"✅ {generate_forecasts()} prévisions enregistrées")
@@ -1,12 +1,16 @@
 # api/generate_alerts.py
-from datetime import datetime, timedelta
-from models import db, Inventory, Sensor, SensorData, Product, Alert, Order,User,Zone
-from sqlalchemy import func
-from flask import Flask, jsonify, request
+from datetime import date, datetime, timedelta
+from models import db, Inventory, Sensor, SensorData, Product, Alert, Order,User,Zone, DailyProductSales
+from sqlalchemy import func, or_, case
+from flask import Flask, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt, verify_jwt_in_request
 from functools import wraps
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.exc import IntegrityError
+from alert_index import active_alerts
+from alert_metrics import alert_metrics
 
 
 # Config log
@@ -32,7 +36,12 @@ def create_alert(product_id, alert_type, status="non traité", user_id=None, zon
     - alert_type : Type de l'alerte.
     - status : Statut de l'alerte (par défaut "non traité").
     - user_id : (optionnel) ID de l'utilisateur associé à l'alerte.
+    Pendant un cycle de génération (active_alerts.batch()), la déduplication se fait sur l'index
+    en mémoire et l'alerte est écrite lors de l'insertion groupée de fin de cycle.
     """
+    if active_alerts.in_batch() and not zone_id:
+        # Comptée dans les mesures de la règle lors de l'écriture groupée
+        return active_alerts.add(product_id, alert_type, status, user_id)
    # Récupérer un utilisateur spécifique basé sur la zone ou le rôle
     if user_id is None:
         if zone_id:
@@ -65,6 +74,7 @@ def create_alert(product_id, alert_type, status="non traité", user_id=None, zon
         try:
             db.session.add(alert)
             db.session.commit()
+            alert_metrics.record_alert()
             logging.info(f"✅ Alerte générée : {alert_type} (Produit ID: {product_id})")
             return alert
         except IntegrityError:
@@ -76,43 +86,108 @@ def create_alert(product_id, alert_type, status="non traité", user_id=None, zon
         return None
 # Fonction pour générer des alertes sur les stocks
 # --- Alerte sur stock ---
-def generate_stock_alerts():
+def generate_stock_alerts(product_ids=None):
     """
     Cette fonction génère des alertes liées aux écarts de stocks, comme les différences entre le stock théorique et mesuré.
+    Version ensembliste : une seule requête jointe (inventaire, seuils du produit, dernière mesure de la zone).
+    La déduplication et l'insertion groupée sont assurées par l'index des alertes actives.
+    - product_ids : (optionnel) limite l'évaluation aux inventaires de ces produits.
     """
-    inventories = Inventory.query.all()  # Récupérer tous les inventaires
-    for inventory in inventories:
-        product = inventory.product  # Récupérer le produit associé à l'inventaire
-        theoretical_stock = inventory.quantity  # Récupérer le stock théorique
+    # Dernière mesure de chaque zone, tous capteurs de la zone confondus (une seule ligne par zone)
+    ranked = db.session.query(
+        Sensor.zone_id.label('zone_id'),
+        SensorData.value.label('value'),
+        func.row_number().over(
+            partition_by=Sensor.zone_id,
+            order_by=(SensorData.saved_at.desc(), SensorData.id.desc())
+        ).label('rank')
+    ).join(SensorData, SensorData.sensor_id == Sensor.id
+    ).subquery()
+    latest_per_zone = db.session.query(ranked.c.zone_id, ranked.c.value
+    ).filter(ranked.c.rank == 1
+    ).subquery()
 
-        # Récupérer les dernières données de capteur dans la même zone
-        last_sensor_data = SensorData.query.join(Sensor).filter(
-            Sensor.zone_id == inventory.zone_id
-        ).order_by(SensorData.saved_at.desc()).first()
+    # Inventaires + seuils + valeur de la dernière mesure de la zone, en une seule requête
+    query = db.session.query(
+        Inventory.product_id,
+        Inventory.zone_id,
+        Inventory.quantity,
+        Product.min_threshold,
+        Product.max_threshold,
+        latest_per_zone.c.value
+    ).join(Product, Product.id == Inventory.product_id
+    ).outerjoin(latest_per_zone, latest_per_zone.c.zone_id == Inventory.zone_id)
+    if product_ids is not None:
+        query = query.filter(Inventory.product_id.in_(product_ids))
+    rows = query.all()
 
+    for product_id, zone_id, theoretical_stock, min_threshold, max_threshold, sensor_value in rows:
         # Si des données de capteur sont disponibles
-        if last_sensor_data:
+        if sensor_value is not None:
             try:
-                measured_stock = int(last_sensor_data.value)  # Convertir la valeur mesurée en stock
+                measured_stock = int(sensor_value)  # Convertir la valeur mesurée en stock
                 # Si l'écart entre le stock théorique et mesuré est supérieur à 5, créer une alerte
                 if abs(theoretical_stock - measured_stock) > 5:
-                    create_alert(product.id, f"Écart de stock : Théorique={theoretical_stock}, Mesuré={measured_stock}")
+                    create_alert(product_id, f"Écart de stock : Théorique={theoretical_stock}, Mesuré={measured_stock}")
             except ValueError:
                 pass  # Si une erreur se produit lors de la conversion, ignorer
 
         # Si le stock théorique est inférieur au seuil minimum du produit, créer une alerte pour rupture de stock
-        if theoretical_stock < product.min_threshold:
-            create_alert(product.id, "Rupture de stock prévue")
+        if theoretical_stock < min_threshold:
+            create_alert(product_id, "Rupture de stock prévue")
         # Si le stock théorique est supérieur au seuil maximum du produit, créer une alerte pour surplus de stock
-        elif theoretical_stock > product.max_threshold:
-            create_alert(product.id, "Surplus de stock prévu")
+        elif theoretical_stock > max_threshold:
+            create_alert(product_id, "Surplus de stock prévu")
+
+
+# --- Profil historique des ventes (année révolue) ---
+# Cache par année : {année: (expiration, {product_id: {mois: nombre de commandes}})}.
+# Vidé par les écritures de commandes de ce processus (clear_seasonal_profiles()) ; la durée
+# de validité borne le retard sur les écritures des autres processus et les reconstructions du cumul.
+SEASONAL_PROFILE_TTL = 3600
+_seasonal_profiles = {}
+
+def get_seasonal_profile(year):
+    """
+    Retourne le nombre de commandes par produit et par mois pour l'année donnée,
+    calculé en une seule requête groupée sur le cumul journalier puis mis en cache.
+    """
+    expires_at, profile = _seasonal_profiles.get(year, (0, None))
+    if profile is None or time.monotonic() >= expires_at:
+        order_month = func.extract('month', DailyProductSales.day)
+        rows = db.session.query(
+            DailyProductSales.product_id,
+            order_month.label('month'),
+            func.sum(DailyProductSales.order_count).label('order_count')
+        ).filter(
+            DailyProductSales.day >= date(year, 1, 1),
+            DailyProductSales.day < date(year + 1, 1, 1)
+        ).group_by(DailyProductSales.product_id, order_month
+        ).all()
+
+        profile = {}
+        for product_id, month, order_count in rows:
+            profile.setdefault(product_id, {})[int(month)] = int(order_count)
+        _seasonal_profiles[year] = (time.monotonic() + SEASONAL_PROFILE_TTL, profile)
+    return profile
+
+def clear_seasonal_profiles(year=None):
+    """
+    Vide le cache des profils, ou seulement celui d'une année (commande créée, modifiée ou supprimée).
+    À appeler après le commit des écritures de commandes et après rebuild_daily_sales().
+    """
+    if year is None:
+        _seasonal_profiles.clear()
+    else:
+        _seasonal_profiles.pop(year, None)
 
 
 # --- Alerte saisonnière et périodes promotionnelles ---
 def generate_seasonal_alerts():
     """
     Cette fonction génère des alertes liées aux tendances saisonnières et périodes promotionnelles.
-    Elle analyse les données historiques de ventes pour détecter des patterns saisonniers.
+    Elle analyse les données historiques de ventes pour détecter des patterns saisonniers
+    à partir du profil en cache de l'année précédente (aucune requête par produit).
     """
     # Obtenir le mois actuel
     current_month = datetime.utcnow().month
@@ -130,82 +205,75 @@ def generate_seasonal_alerts():
     if current_month in seasonal_periods:
         season_name = seasonal_periods[current_month]
         
+        # Profil des commandes de l'année précédente
+        last_year_profile = get_seasonal_profile(datetime.utcnow().year - 1)
+        
         # Obtenir tous les produits
-        products = Product.query.all()
+        products = db.session.query(Product.id, Product.designation).all()
         
         # Pour chaque produit, vérifier les commandes de l'année précédente pendant cette période
-        for product in products:
-            # Calculer les dates de l'année précédente pour ce mois
-            last_year = datetime.utcnow().year - 1
-            start_date = datetime(last_year, current_month, 1)
-            
-            # Calcul du dernier jour du mois
-            if current_month == 12:
-                end_date = datetime(last_year, 12, 31)
-            else:
-                end_date = datetime(last_year, current_month + 1, 1) - timedelta(days=1)
-            
-            # Compter les commandes pour ce produit l'année dernière pendant cette période
-            order_count = Order.query.filter(
-                Order.product_id == product.id,
-                Order.created_at.between(start_date, end_date)
-            ).count()
+        for product_id, designation in products:
+            order_count = last_year_profile.get(product_id, {}).get(current_month, 0)
             
             # Si beaucoup de commandes ont été passées l'année dernière, générer une alerte
             if order_count > 10:  # Seuil arbitraire, à ajuster selon les besoins
                 create_alert(
-                    product.id, 
+                    product_id, 
                     f"Période saisonnière : {season_name} - Hausse probable de la demande basée sur l'historique",
                     "à planifier"
                 )
-                logging.info(f"⚠️ Alerte saisonnière pour {product.designation} - Période: {season_name}")
+                logging.info(f"⚠️ Alerte saisonnière pour {designation} - Période: {season_name}")
 
 
 # Fonction pour générer des alertes sur les capteurs hors ligne
 def generate_sensor_alerts():
     """
     Cette fonction génère des alertes lorsque des capteurs ne transmettent plus de données depuis une certaine période.
+    Les capteurs hors ligne, le nom de leur zone et les produits de la zone sont récupérés en une seule jointure.
     """
     twelve_hours_ago = datetime.utcnow() - timedelta(hours=12)  # Calculer l'heure il y a 12 heures
-    sensors = Sensor.query.all()  # Récupérer tous les capteurs
-    for sensor in sensors:
-        # Si aucun relevé n'a été fait ou si le dernier relevé est plus vieux que 12 heures
-        if not sensor.last_reading or sensor.last_reading < twelve_hours_ago:
-            # Récupérer les produits associés à la zone du capteur
-            inventories = Inventory.query.filter_by(zone_id=sensor.zone_id).all()
-            
-            if inventories:
-                # Créer une alerte pour chaque produit dans la zone
-                for inventory in inventories:
-                    create_alert(
-                        product_id=inventory.product_id,  
-                        alert_type=f"Capteur {sensor.id} hors ligne (Zone {sensor.zone.name})",
-                        status="urgent"
-                    )
-                    logging.info(f"❌ Capteur {sensor.id} hors ligne dans la zone {sensor.zone.name}")
-            else:
-                # Si aucun produit n'est associé à cette zone, créer une alerte générique
-                admin_user = User.query.filter_by(role='admin').first()
-                if admin_user:
-                    create_alert(
-                        product_id=None,  
-                        alert_type=f"Capteur {sensor.id} hors ligne (Zone {sensor.zone.name})",
-                        status="urgent",
-                        user_id=admin_user.id
-                    )
-                    logging.info(f"❌ Capteur {sensor.id} hors ligne dans la zone {sensor.zone.name}")
+
+    # Capteurs sans relevé ou dont le dernier relevé est plus vieux que 12 heures, avec les produits de leur zone
+    rows = db.session.query(
+        Sensor.id,
+        Zone.name,
+        Inventory.product_id
+    ).join(Zone, Zone.id == Sensor.zone_id
+    ).outerjoin(Inventory, Inventory.zone_id == Sensor.zone_id
+    ).filter(or_(
+        Sensor.last_reading.is_(None),
+        Sensor.last_reading < twelve_hours_ago
+    )).order_by(Sensor.id
+    ).all()
+
+    for sensor_id, zone_name, product_id in rows:
+        if product_id is None:
+            # Une alerte est toujours rattachée à un produit (alerts.product_id non nul) : zone vide, rien à alerter
+            logging.warning(f"❌ Capteur {sensor_id} hors ligne dans la zone {zone_name} (aucun produit dans la zone)")
+            continue
+        # Une alerte par produit de la zone
+        create_alert(
+            product_id=product_id,  
+            alert_type=f"Capteur {sensor_id} hors ligne (Zone {zone_name})",
+            status="urgent"
+        )
+        logging.info(f"❌ Capteur {sensor_id} hors ligne dans la zone {zone_name}")
 
 
 
 # Fonction pour générer des alertes pour les commandes importantes
-def generate_order_alerts():
+def generate_order_alerts(product_ids=None):
     """
     Génère des alertes pour les commandes importantes nécessitant une validation manuelle.
+    - product_ids : (optionnel) limite l'évaluation aux commandes de ces produits.
     """
-    big_orders = Order.query.filter(
+    big_orders_query = Order.query.filter(
         Order.quantity > 300,
         Order.status == "en attente"
-    ).all()
+    )
+    if product_ids is not None:
+        big_orders_query = big_orders_query.filter(Order.product_id.in_(product_ids))
+    big_orders = big_orders_query.all()
     
     for order in big_orders:
         # Vérifier si une alerte existe déjà pour cette commande spécifique
@@ -235,89 +303,103 @@ def generate_demand_trend_alerts():
     """
     Cette fonction génère des alertes lorsque la demande pour un produit augmente de manière significative.
     """
-    current_month = datetime.utcnow().month  # Récupérer le mois actuel
-    previous_month = current_month - 1 if current_month > 1 else 12  # Calculer le mois précédent
-    current_year = datetime.utcnow().year
-    previous_year = current_year if previous_month != 12 else current_year - 1  # Ajuster l'année si nécessaire
-    
-    for product in Product.query.all():  # Récupérer tous les produits
-        # Calculer la demande actuelle pour ce produit
-        current_demand = db.session.query(func.sum(Order.quantity)).filter(
-            func.extract('month', Order.created_at) == current_month,
-            func.extract('year', Order.created_at) == current_year,
-            Order.product_id == product.id
-        ).scalar() or 0
-
-        # Calculer la demande pour le mois précédent
-        previous_demand = db.session.query(func.sum(Order.quantity)).filter(
-            func.extract('month', Order.created_at) == previous_month,
-            func.extract('year', Order.created_at) == previous_year,
-            Order.product_id == product.id
-        ).scalar() or 1  # Utiliser 1 pour éviter division par zéro
+    # Bornes des mois courant et précédent (plage de jours du cumul journalier)
+    now = datetime.utcnow()
+    current_start = date(now.year, now.month, 1)
+    next_start = date(now.year + 1, 1, 1) if now.month == 12 else date(now.year, now.month + 1, 1)
+    previous_start = date(now.year - 1, 12, 1) if now.month == 1 else date(now.year, now.month - 1, 1)
+
+    # Demande du mois courant et du mois précédent pour tous les produits, en une seule requête groupée
+    demand_rows = db.session.query(
+        DailyProductSales.product_id,
+        Product.designation,
+        func.sum(case((DailyProductSales.day >= current_start, DailyProductSales.quantity), else_=0)).label('current_demand'),
+        func.sum(case((DailyProductSales.day < current_start, DailyProductSales.quantity), else_=0)).label('previous_demand')
+    ).join(Product, Product.id == DailyProductSales.product_id
+    ).filter(
+        DailyProductSales.day >= previous_start,
+        DailyProductSales.day < next_start
+    ).group_by(DailyProductSales.product_id, Product.designation
+    ).all()
+
+    for product_id, designation, current_demand, previous_demand in demand_rows:
+        current_demand = current_demand or 0
+        previous_demand = previous_demand or 1  # Utiliser 1 pour éviter division par zéro
 
         # Si la demande actuelle a augmenté de plus de 40% par rapport au mois précédent, générer une alerte
         if current_demand > 0 and previous_demand > 0 and (current_demand / previous_demand) > 1.4:
             increase_percentage = int((current_demand - previous_demand) / previous_demand * 100)
             create_alert(
-                product.id, 
+                product_id, 
                 f"Demande en hausse : +{increase_percentage}% ce mois-ci",
                 "à planifier"
             )
-            logging.info(f"📈 Hausse de la demande détectée pour {product.designation}: +{increase_percentage}%")
+            logging.info(f"📈 Hausse de la demande détectée pour {designation}: +{increase_percentage}%")
+
 
 
+# Seuils par défaut des zones sans seuils configurés (Zone.min_threshold / Zone.max_threshold)
+DEFAULT_ZONE_MIN_QUANTITY = 20
+DEFAULT_ZONE_MAX_QUANTITY = 500
 
 def generate_storage_optimization_alerts():
     """
     Génère des alertes pour optimiser l'utilisation de l'espace de stockage.
+    Nombre fixe de requêtes quel que soit le nombre de zones : totaux, seuils et produit
+    représentatif par zone en une requête, alertes d'optimisation récentes en une autre.
     Retourne le nombre d'alertes créées.
     """
     try:
-        # Récupérer les totaux par zone en une seule requête
+        min_quantity = func.coalesce(Zone.min_threshold, DEFAULT_ZONE_MIN_QUANTITY)
+        max_quantity = func.coalesce(Zone.max_threshold, DEFAULT_ZONE_MAX_QUANTITY)
+
+        # Récupérer les totaux, les seuils et un produit associé par zone en une seule requête
         zone_totals = db.session.query(
             Inventory.zone_id,
             Zone.name.label('zone_name'),
-            func.sum(Inventory.quantity).label('total_quantity')
+            func.sum(Inventory.quantity).label('total_quantity'),
+            func.min(Inventory.product_id).label('product_id'),
+            min_quantity.label('min_quantity'),
+            max_quantity.label('max_quantity')
         ).join(Zone, Zone.id == Inventory.zone_id
-        ).group_by(Inventory.zone_id, Zone.name
+        ).group_by(Inventory.zone_id, Zone.name, Zone.min_threshold, Zone.max_threshold
         ).all()
 
         alerts_created = 0
         current_time = datetime.utcnow()
         time_threshold = current_time - timedelta(hours=24)
 
-        for zone_id, zone_name, total in zone_totals:
+        # Alertes d'optimisation des dernières 24 heures, chargées une seule fois
+        existing_types = {
+            alert_type for (alert_type,) in db.session.query(Alert.type).filter(
+                Alert.status == "optimisation",
+                Alert.created_at >= time_threshold
+            ).all()
+        }
+
+        for zone_id, zone_name, total, product_id, zone_min, zone_max in zone_totals:
             # Déterminer le type d'alerte
             alert_type = None
-            if total < 20:
+            if total < zone_min:
                 alert_type = f"Zone {zone_name} sous-utilisée (Quantité: {total})"
-            elif total > 500:
+            elif total > zone_max:
                 alert_type = f"Zone {zone_name} surchargée (Quantité: {total})"
 
             if not alert_type:
                 continue
 
             # Vérifier l'existence d'une alerte similaire
-            if Alert.query.filter(
-                Alert.type == alert_type,
-                Alert.status == "optimisation",
-                Alert.created_at >= time_threshold
-            ).first():
+            if alert_type in existing_types:
                 logging.info(f"📉 Alerte existante pour {alert_type}. Ignorée.")
                 continue
 
-            # Récupérer un produit associé à la zone
-            inventory = Inventory.query.filter_by(zone_id=zone_id).first()
-            if not inventory:
-                logging.warning(f"⚠️ Aucun produit trouvé pour la zone {zone_name}")
-                continue
-
             # Créer l'alerte
             create_alert(
-                inventory.product_id,
+                product_id,
                 alert_type,
                 "optimisation"
             )
+            existing_types.add(alert_type)
             alerts_created += 1
             logging.info(f"📈 Alerte créée : {alert_type} pour la zone {zone_name}")
 
@@ -327,18 +409,70 @@ def generate_storage_optimization_alerts():
         logging.error(f"❌ Erreur lors de la génération des alertes : {str(e)}")
         raise
                     
+# Règles exécutées à chaque cycle, dans l'ordre
+ALERT_RULES = [
+    ("stock", generate_stock_alerts),
+    ("seasonal", generate_seasonal_alerts),
+    ("sensor", generate_sensor_alerts),
+    ("order", generate_order_alerts),
+    ("demand_trend", generate_demand_trend_alerts),
+    ("storage_optimization", generate_storage_optimization_alerts),
+]
+
+def _run_rule_in_context(app, name, rule):
+    """Exécute une règle dans un thread du pool, avec son propre contexte et sa propre session"""
+    with app.app_context():
+        with active_alerts.attach():
+            with alert_metrics.rule(name):
+                rule()
+
 # Fonction pour générer toutes les alertes en une fois
-def generate_all_alerts():
+def generate_all_alerts(parallel=None):
     """
     Cette fonction génère toutes les alertes possibles dans le système.
+    Chaque règle est mesurée (durée, requêtes SQL, lignes lues, alertes créées) ;
+    le dernier cycle est disponible dans alert_metrics.last_run.
+    - parallel : exécute les règles en parallèle sur un pool de threads, chacune avec sa session
+      (par défaut : configuration ALERTS_PARALLEL_RULES). Les alertes candidates sont dédupliquées
+      sur l'index commun puis écrites en une seule insertion groupée.
+    """
+    if parallel is None:
+        parallel = current_app.config.get('ALERTS_PARALLEL_RULES', False)
+
+    with alert_metrics.run():
+        # Index des alertes actives chargé une fois, alertes écrites en une seule insertion en fin de cycle
+        with active_alerts.batch():
+            if parallel:
+                app = current_app._get_current_object()
+                with ThreadPoolExecutor(max_workers=len(ALERT_RULES)) as executor:
+                    futures = [
+                        executor.submit(_run_rule_in_context, app, name, rule)
+                        for name, rule in ALERT_RULES
+                    ]
+                # Propager la première erreur une fois toutes les règles terminées
+                for future in futures:
+                    future.result()
+            else:
+                for name, rule in ALERT_RULES:
+                    with alert_metrics.rule(name):
+                        rule()
+            with alert_metrics.rule("bulk_write"):
+                alert_metrics.record_alert(active_alerts.flush())
+
+# Réévaluation ciblée après écriture (inventaire, commandes)
+def generate_product_alerts(product_ids):
     """
-    generate_stock_alerts()
-    generate_seasonal_alerts()
-    generate_sensor_alerts()
-    generate_order_alerts()
-    generate_demand_trend_alerts()
-    generate_storage_optimization_alerts()
-    db.session.commit()  # Enregistrer toutes les alertes dans la base de données
+    Réévalue uniquement les règles de stock et de commandes pour les produits donnés.
+    Utilisée par la file d'événements (alert_events.py) ; le balayage complet
+    generate_all_alerts() reste la passe de réconciliation périodique.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    with active_alerts.batch():
+        generate_stock_alerts(product_ids)
+        generate_order_alerts(product_ids)
+
 # --- Route Flask ---
 app = Flask(__name__) 
 @app.route("/generate_alerts", methods=["POST"])
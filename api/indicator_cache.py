@@ -0,0 +1,87 @@
+# indicator_cache.py
+import threading
+import time
+
+# Durée de validité des indicateurs de la page Prediction (secondes)
+INDICATORS_CACHE_TTL = 60
+
+
+class CachedPayload:
+    """
+    Réponse calculée une fois puis servie à tous les clients pendant `ttl` secondes.
+    - Un seul calcul à la fois : les requêtes arrivées pendant le calcul attendent son résultat
+      au lieu de lancer le même calcul en parallèle.
+    - invalidate() est appelée après le commit des écritures qui changent le résultat
+      (inventaire, commandes, seuils des produits). Un calcul commencé avant l'invalidation
+      n'est pas mis en cache.
+    Le cache est propre au processus : dans un autre processus, la TTL borne le retard.
+    """
+
+    def __init__(self, ttl=INDICATORS_CACHE_TTL):
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0
+        self._version = 0
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.last_computed_at = None
+        self.last_duration_ms = None
+
+    def _cached(self):
+        if self._value is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._value
+        return None
+
+    def get_or_compute(self, compute):
+        """Valeur en cache, sinon résultat de compute() (appelée par une seule requête à la fois)"""
+        with self._lock:
+            value = self._cached()
+        if value is not None:
+            return value
+
+        with self._compute_lock:
+            with self._lock:
+                # Calculée par la requête qui détenait le verrou pendant l'attente
+                value = self._cached()
+                if value is not None:
+                    return value
+                self.misses += 1
+                version = self._version
+
+            started = time.perf_counter()
+            value = compute()
+            with self._lock:
+                self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.last_computed_at = time.time()
+                if self._version == version:
+                    self._value = value
+                    self._expires_at = time.monotonic() + self.ttl
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._value = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'ttl_seconds': self.ttl,
+                'cached': self._value is not None and time.monotonic() < self._expires_at,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else None,
+                'invalidations': self.invalidations,
+                'last_computed_at': self.last_computed_at,
+                'last_duration_ms': self.last_duration_ms
+            }
+
+
+# Indicateurs de /api/prediction/indicators, partagés par les requêtes du processus
+prediction_indicators = CachedPayload()
@@ -1,13 +1,17 @@
 #insert_data.py
 from app import app, db
-from models import User, Product, Category, Zone, Inventory, Customer,Sensor, SensorData, Alert, Order, OrderPrediction
+from models import User, Product, Category, Zone, Inventory, Customer,Sensor, SensorData, Alert, Order, OrderPrediction, DailyProductSales
 from datetime import datetime, timedelta
+from inventory_service import rebuild_zone_occupancy
+from sales_rollup import rebuild_daily_sales
+from generate_alerts import clear_seasonal_profiles
 
 # Initialiser l'application et la base de données
 with app.app_context():
     # Nettoyer les données existantes (dans l'ordre pour éviter les problèmes de contraintes de clé étrangère)
     db.session.query(SensorData).delete()
     db.session.query(OrderPrediction).delete()
+    db.session.query(DailyProductSales).delete()
     db.session.query(Order).delete()
     db.session.query(Alert).delete()
     db.session.query(Inventory).delete()
@@ -186,6 +190,8 @@ with app.app_context():
     
     db.session.add_all([order1, order2])
     db.session.flush()
+    # Cumul journalier des ventes
+    rebuild_daily_sales()
     
    
     
@@ -212,6 +218,9 @@ with app.app_context():
     )
     
     db.session.add_all([inventory1, inventory2, inventory3])
+    db.session.flush()
+    # Compteurs d'emplacements occupés des zones
+    rebuild_zone_occupancy()
     
     # Créer une prédiction de commande
     prediction = OrderPrediction(
@@ -226,5 +235,7 @@ with app.app_context():
     
     # Valider toutes les modifications
     db.session.commit()
+    # Profils saisonniers calculés sur l'ancien cumul
+    clear_seasonal_profiles()
 
 print("Données insérées avec succès.")
\ No newline at end of file
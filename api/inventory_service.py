@@ -0,0 +1,139 @@
+# inventory_service.py
+from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, Inventory, Zone
+
+
+def _upsert_statement(rows, dialect):
+    """
+    INSERT multi-lignes qui incrémente la quantité des lignes (product_id, zone_id) existantes :
+    INSERT ... ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity) sous MySQL.
+    """
+    table = Inventory.__table__
+    if dialect in ('sqlite', 'postgresql'):
+        # Bases de test / autres moteurs : INSERT ... ON CONFLICT DO UPDATE équivalent
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.product_id, table.c.zone_id],
+            set_={
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'last_update_at': stmt.excluded.last_update_at
+            }
+        )
+    stmt = mysql.insert(table).values(rows)
+    return stmt.on_duplicate_key_update(
+        quantity=table.c.quantity + stmt.inserted.quantity,
+        last_update_at=stmt.inserted.last_update_at
+    )
+
+
+def add_occupied_slots(zone_id, count):
+    """Ajoute (ou retire) des emplacements occupés au compteur de la zone"""
+    if count:
+        db.session.execute(
+            Zone.__table__.update().where(Zone.__table__.c.id == zone_id)
+            .values(occupied_slots=Zone.__table__.c.occupied_slots + count)
+        )
+
+
+def apply_inventory_deltas(deltas):
+    """
+    Ajoute des quantités à l'inventaire sans lecture préalable : une instruction par zone,
+    deux scans simultanés ne peuvent plus perdre d'incrément ni échouer sur la clé primaire composite.
+    - deltas : {(product_id, zone_id): quantité} ou itérable de (product_id, zone_id, quantité)
+    Les deltas d'un même couple sont additionnés ; les lignes créées sont comptées dans
+    Zone.occupied_slots. Le commit revient à l'appelant.
+    Retourne les deltas appliqués {(product_id, zone_id): quantité}.
+    """
+    if isinstance(deltas, dict):
+        merged = {key: quantity for key, quantity in deltas.items() if quantity}
+    else:
+        merged = defaultdict(int)
+        for product_id, zone_id, quantity in deltas:
+            merged[(product_id, zone_id)] += quantity
+        merged = {key: quantity for key, quantity in merged.items() if quantity}
+    if not merged:
+        return {}
+
+    now = datetime.utcnow()
+    dialect = db.session.get_bind().dialect.name
+    # Ordre fixe (zone, produit) : les écritures concurrentes verrouillent les lignes dans le même ordre
+    keys = sorted(merged, key=lambda key: (key[1], key[0]))
+    for zone_id, zone_keys in groupby(keys, key=lambda key: key[1]):
+        rows = [
+            {'product_id': product_id, 'zone_id': zone_id, 'quantity': merged[(product_id, zone_id)], 'last_update_at': now}
+            for product_id, _ in zone_keys
+        ]
+        if dialect == 'mysql':
+            result = db.session.execute(_upsert_statement(rows, dialect))
+            # Lignes affectées par ON DUPLICATE KEY UPDATE : 1 par ligne insérée, 2 par ligne modifiée
+            created = 2 * len(rows) - result.rowcount
+        else:
+            existing = db.session.query(func.count()).select_from(Inventory).filter(
+                Inventory.zone_id == zone_id,
+                Inventory.product_id.in_([row['product_id'] for row in rows])
+            ).scalar()
+            db.session.execute(_upsert_statement(rows, dialect))
+            created = len(rows) - existing
+        add_occupied_slots(zone_id, created)
+    return merged
+
+
+def increment_inventory(product_id, zone_id, quantity=1):
+    """Ajoute `quantity` au stock du produit dans la zone. Retourne la nouvelle quantité (sans commit)."""
+    apply_inventory_deltas({(product_id, zone_id): quantity})
+    return db.session.query(Inventory.quantity).filter_by(product_id=product_id, zone_id=zone_id).scalar()
+
+
+def reserve_zone_slot():
+    """
+    Première zone (par id) ayant un emplacement libre, en une requête.
+    La ligne de la zone est verrouillée (SELECT ... FOR UPDATE) jusqu'au commit de l'appelant :
+    deux scans simultanés ne peuvent pas prendre le même dernier emplacement.
+    Retourne la zone, ou None si toutes sont pleines.
+    """
+    return Zone.query.filter(
+        Zone.occupied_slots < Zone.capacity
+    ).order_by(Zone.id).with_for_update().first()
+
+
+def remove_product_inventory(product_id):
+    """Supprime l'inventaire d'un produit et libère ses emplacements. Retourne le nombre de lignes supprimées."""
+    zone_ids = [zone_id for (zone_id,) in db.session.query(Inventory.zone_id).filter_by(product_id=product_id)]
+    for zone_id in zone_ids:
+        add_occupied_slots(zone_id, -1)
+    return Inventory.query.filter_by(product_id=product_id).delete()
+
+
+def rebuild_zone_occupancy():
+    """Recalcule Zone.occupied_slots à partir de l'inventaire (une seule instruction)"""
+    zones = Zone.__table__
+    inventory = Inventory.__table__
+    occupied = select(func.count()).where(inventory.c.zone_id == zones.c.id).scalar_subquery()
+    db.session.execute(zones.update().values(occupied_slots=occupied))
+
+
+class InventoryDeltas:
+    """
+    Incréments accumulés sur plusieurs scans (endpoints groupés) puis écrits par apply()
+    en une instruction par zone.
+    """
+
+    def __init__(self):
+        self._deltas = defaultdict(int)
+
+    def add(self, product_id, zone_id, quantity=1):
+        self._deltas[(product_id, zone_id)] += quantity
+
+    @property
+    def product_ids(self):
+        return {product_id for product_id, _ in self._deltas}
+
+    def apply(self):
+        applied = apply_inventory_deltas(dict(self._deltas))
+        self._deltas.clear()
+        return applied
@@ -0,0 +1,20 @@
+# migrate_daily_sales.py
+# Crée la table daily_product_sales (cumul journalier des commandes par produit) puis la remplit
+# à partir des commandes existantes.
+# Relancer le script reconstruit le cumul (après un import ou une correction directe de la table orders).
+from app import app, db
+from models import DailyProductSales
+from sales_rollup import rebuild_daily_sales
+from generate_alerts import clear_seasonal_profiles
+
+def migrate_daily_sales():
+    with app.app_context():
+        DailyProductSales.__table__.create(db.engine, checkfirst=True)
+        rebuild_daily_sales()
+        db.session.commit()
+        # Les autres processus relisent le cumul à l'expiration de leur cache (SEASONAL_PROFILE_TTL)
+        clear_seasonal_profiles()
+        print(f"✅ Cumul journalier reconstruit : {DailyProductSales.query.count()} lignes")
+
+if __name__ == "__main__":
+    migrate_daily_sales()
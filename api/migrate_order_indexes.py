@@ -0,0 +1,22 @@
+# migrate_order_indexes.py
+# Crée sur une base existante les index déclarés sur la table orders (dont ix_orders_created_at,
+# utilisé par les filtres de dates des indicateurs et des prédictions).
+# Le script peut être relancé : les index déjà présents sont conservés.
+from app import app, db
+from models import Order
+from sqlalchemy import inspect
+
+def add_missing_indexes():
+    existing = {index['name'] for index in inspect(db.engine).get_indexes('orders')}
+    for index in Order.__table__.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+            print(f"✅ Index {index.name} créé")
+
+def migrate_order_indexes():
+    with app.app_context():
+        add_missing_indexes()
+        print("✅ Index de la table orders prêts")
+
+if __name__ == "__main__":
+    migrate_order_indexes()
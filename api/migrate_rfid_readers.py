@@ -0,0 +1,15 @@
+# migrate_rfid_readers.py
+# Crée la table rfid_readers (lecteurs RFID supervisés) sur une base existante puis déclare
+# le lecteur de la porte historique (SERIAL_PORT) si aucun lecteur de porte n'est configuré.
+# Le script peut être relancé sans effet sur les lecteurs déjà déclarés.
+from app import app, db, ensure_door_reader
+from models import RFIDReader
+
+def migrate_rfid_readers():
+    with app.app_context():
+        RFIDReader.__table__.create(db.engine, checkfirst=True)
+        ensure_door_reader()
+        print(f"✅ Table rfid_readers prête : {RFIDReader.query.count()} lecteurs déclarés")
+
+if __name__ == "__main__":
+    migrate_rfid_readers()
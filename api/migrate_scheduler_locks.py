@@ -0,0 +1,13 @@
+# migrate_scheduler_locks.py
+# Crée la table scheduler_locks (bail du processus leader des tâches planifiées) sur une base existante.
+# Le script peut être relancé : une table déjà présente est conservée.
+from app import app, db
+from models import SchedulerLock
+
+def migrate_scheduler_locks():
+    with app.app_context():
+        SchedulerLock.__table__.create(db.engine, checkfirst=True)
+        print("✅ Table scheduler_locks prête")
+
+if __name__ == "__main__":
+    migrate_scheduler_locks()
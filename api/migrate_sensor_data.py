@@ -0,0 +1,86 @@
+# migrate_sensor_data.py
+# Ajoute les colonnes structurées de sensor_data (uid, weight, zone_id, source, product_id),
+# leurs index, puis les remplit à partir de la colonne value pour les lignes existantes.
+from app import app, db
+from models import SensorData
+from readings import parse_reading, grams_to_kg, SOURCE_DOOR, SOURCE_ZONE
+from sqlalchemy import inspect, text
+
+NEW_COLUMNS = {
+    'uid': "VARCHAR(100) NULL",
+    'weight': "FLOAT NULL",
+    'zone_id': "INTEGER NULL",
+    'source': "VARCHAR(50) NULL",
+    'product_id': "INTEGER NULL",
+}
+
+NEW_FOREIGN_KEYS = {
+    'zone_id': ("fk_sensor_data_zone_id", "zones(id)"),
+    'product_id': ("fk_sensor_data_product_id", "products(id)"),
+}
+
+BATCH_SIZE = 1000
+
+def add_missing_columns():
+    existing = {column['name'] for column in inspect(db.engine).get_columns('sensor_data')}
+    with db.engine.begin() as conn:
+        for name, definition in NEW_COLUMNS.items():
+            if name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE sensor_data ADD COLUMN {name} {definition}"))
+            if name in NEW_FOREIGN_KEYS:
+                constraint, target = NEW_FOREIGN_KEYS[name]
+                conn.execute(text(
+                    f"ALTER TABLE sensor_data ADD CONSTRAINT {constraint} FOREIGN KEY ({name}) REFERENCES {target}"
+                ))
+            print(f"✅ Colonne sensor_data.{name} ajoutée")
+
+def add_missing_indexes():
+    existing = {index['name'] for index in inspect(db.engine).get_indexes('sensor_data')}
+    for index in SensorData.__table__.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+            print(f"✅ Index {index.name} créé")
+
+def backfill_structured_columns():
+    """Remplit uid, weight (kg), zone_id et source par lots à partir de la trame JSON"""
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.session.query(SensorData.id, SensorData.value).filter(
+            SensorData.uid.is_(None),
+            SensorData.id > last_id
+        ).order_by(SensorData.id).limit(BATCH_SIZE).all()
+        if not rows:
+            break
+
+        mappings = []
+        for row_id, value in rows:
+            uid, weight, zone_id = parse_reading(value)
+            if uid is None:
+                continue
+            mappings.append({
+                'id': row_id,
+                'uid': uid,
+                # Trame des lecteurs en grammes, SensorData.weight en kg (comme rfid_ingest et zone_rfid)
+                'weight': grams_to_kg(weight),
+                'zone_id': zone_id,
+                'source': SOURCE_ZONE if zone_id else SOURCE_DOOR
+            })
+
+        if mappings:
+            db.session.bulk_update_mappings(SensorData, mappings)
+            db.session.commit()
+            updated += len(mappings)
+        last_id = rows[-1][0]
+
+    print(f"✅ {updated} lectures existantes mises à jour")
+
+def migrate_sensor_data():
+    with app.app_context():
+        add_missing_columns()
+        add_missing_indexes()
+        backfill_structured_columns()
+
+if __name__ == "__main__":
+    migrate_sensor_data()
@@ -0,0 +1,32 @@
+# migrate_zone_capacity.py
+# Ajoute les colonnes de capacité des zones (capacity, occupied_slots) puis recalcule
+# le nombre d'emplacements occupés à partir de l'inventaire existant.
+# Relancer le script recalcule les compteurs (après une modification manuelle de l'inventaire).
+from app import app, db
+from models import DEFAULT_ZONE_CAPACITY
+from inventory_service import rebuild_zone_occupancy
+from sqlalchemy import inspect, text
+
+NEW_COLUMNS = {
+    'capacity': f"INTEGER NOT NULL DEFAULT {DEFAULT_ZONE_CAPACITY}",
+    'occupied_slots': "INTEGER NOT NULL DEFAULT 0",
+}
+
+def add_missing_columns():
+    existing = {column['name'] for column in inspect(db.engine).get_columns('zones')}
+    with db.engine.begin() as conn:
+        for name, definition in NEW_COLUMNS.items():
+            if name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE zones ADD COLUMN {name} {definition}"))
+            print(f"✅ Colonne zones.{name} ajoutée")
+
+def migrate_zone_capacity():
+    with app.app_context():
+        add_missing_columns()
+        rebuild_zone_occupancy()
+        db.session.commit()
+        print("✅ Emplacements occupés recalculés")
+
+if __name__ == "__main__":
+    migrate_zone_capacity()
@@ -0,0 +1,28 @@
+# migrate_zone_thresholds.py
+# Ajoute les seuils de quantité des zones (min_threshold, max_threshold) utilisés par les alertes
+# d'optimisation du stockage. Les zones existantes gardent des seuils vides (valeurs par défaut).
+# Le script peut être relancé : les colonnes déjà présentes sont ignorées.
+from app import app, db
+from sqlalchemy import inspect, text
+
+NEW_COLUMNS = {
+    'min_threshold': "FLOAT NULL",
+    'max_threshold': "FLOAT NULL",
+}
+
+def add_missing_columns():
+    existing = {column['name'] for column in inspect(db.engine).get_columns('zones')}
+    with db.engine.begin() as conn:
+        for name, definition in NEW_COLUMNS.items():
+            if name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE zones ADD COLUMN {name} {definition}"))
+            print(f"✅ Colonne zones.{name} ajoutée")
+
+def migrate_zone_thresholds():
+    with app.app_context():
+        add_missing_columns()
+        print("✅ Seuils des zones prêts")
+
+if __name__ == "__main__":
+    migrate_zone_thresholds()
@@ -88,12 +88,21 @@ class Product(db.Model):
     def __repr__(self):
         return f'<Product {self.designation}>'
 
+# Emplacements par zone si aucune capacité n'est précisée
+DEFAULT_ZONE_CAPACITY = 8
+
 class Zone(db.Model):
     __tablename__ = 'zones'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
+    # Seuils de quantité totale pour les alertes d'optimisation (NULL = valeurs par défaut 20 / 500)
+    min_threshold = db.Column(db.Float)
+    max_threshold = db.Column(db.Float)
+    # Emplacements : une ligne d'inventaire (produit distinct) par emplacement
+    capacity = db.Column(db.Integer, nullable=False, default=DEFAULT_ZONE_CAPACITY)
+    occupied_slots = db.Column(db.Integer, nullable=False, default=0)  # Tenu à jour par inventory_service.py
     
     # Relations
     inventories = db.relationship('Inventory', backref='zone', lazy=True)
@@ -131,15 +140,43 @@ class Sensor(db.Model):
     def __repr__(self):
         return f'<Sensor {self.id} type={self.type}>'
 
+class RFIDReader(db.Model):
+    __tablename__ = 'rfid_readers'
+    
+    # Configuration d'un lecteur RFID série géré par le superviseur (rfid_supervisor.py)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    port = db.Column(db.String(255), nullable=False)  # COM4, /dev/ttyUSB0 ou URL pyserial
+    baud_rate = db.Column(db.Integer, nullable=False, default=9600)
+    role = db.Column(db.String(50), nullable=False)  # door, zone
+    zone_id = db.Column(db.Integer, db.ForeignKey('zones.id'), nullable=True)  # Zone surveillée (lecteurs de zone)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)  # Démarré automatiquement au lancement
+    
+    def __repr__(self):
+        return f'<RFIDReader {self.name} port={self.port}>'
+
 class SensorData(db.Model):
     __tablename__ = 'sensor_data'
+    __table_args__ = (
+        # Déduplication des lectures et rapprochement porte -> zone par UID
+        db.Index('ix_sensor_data_uid_saved_at', 'uid', 'saved_at'),
+        # Recherche des scans de porte en attente de rangement
+        db.Index('ix_sensor_data_stored_saved_at', 'stored', 'saved_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=True)
-    value = db.Column(db.String(255), nullable=False)
+    value = db.Column(db.String(255), nullable=False)  # Trame brute reçue du lecteur
     saved_at = db.Column(db.DateTime, default=datetime.utcnow)
     stored = db.Column(db.Boolean, default=False)
     
+    # Champs extraits de la trame à l'enregistrement (voir readings.py)
+    uid = db.Column(db.String(100))  # UID RFID en majuscules
+    weight = db.Column(db.Float)  # Poids en kg
+    zone_id = db.Column(db.Integer, db.ForeignKey('zones.id'), nullable=True)
+    source = db.Column(db.String(50))  # door, zone
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
+    
     
     def __repr__(self):
         return f'<SensorData {self.id} sensor_id={self.sensor_id}>'
@@ -166,7 +203,7 @@ class Order(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(50), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     delivered_at = db.Column(db.DateTime)
     returned_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # L'utilisateur qui a créé la commande
@@ -177,6 +214,19 @@ class Order(db.Model):
     def __repr__(self):
         return f'<Order {self.id} product_id={self.product_id}>'
 
+class DailyProductSales(db.Model):
+    __tablename__ = 'daily_product_sales'
+    # Cumul journalier des commandes par produit, tenu à jour par sales_rollup.py
+    # (création, modification et suppression de commandes) ; reconstruit par migrate_daily_sales.py
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)  # Jour de Order.created_at
+    quantity = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyProductSales product_id={self.product_id} day={self.day}>'
+
 class OrderPrediction(db.Model):
     __tablename__ = 'order_predictions'
     
@@ -198,4 +248,22 @@ class OrderPrediction(db.Model):
 prediction_orders = db.Table('prediction_orders',
     db.Column('prediction_id', db.Integer, db.ForeignKey('order_predictions.id'), primary_key=True),
     db.Column('order_id', db.Integer, db.ForeignKey('orders.id'), primary_key=True)
-)
\ No newline at end of file
+)
+
+class SchedulerLock(db.Model):
+    __tablename__ = 'scheduler_locks'
+    
+    # Un verrou par tâche planifiée : le processus propriétaire est le leader tant que le bail est valide
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+    
+    # Dernière exécution de la tâche (tous processus confondus)
+    last_run_owner = db.Column(db.String(100))
+    last_run_started_at = db.Column(db.DateTime)
+    last_run_duration_ms = db.Column(db.Float)
+    last_run_status = db.Column(db.String(50))  # ok, error
+    last_run_error = db.Column(db.String(255))
+    
+    def __repr__(self):
+        return f'<SchedulerLock {self.name} owner={self.owner}>'
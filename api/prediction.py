@@ -1,61 +1,89 @@
 # prediction.py
 from flask import Blueprint, jsonify, request
-from sqlalchemy import func
+from sqlalchemy import func, case
 from datetime import datetime, timedelta
-from models import db, Product, Inventory, Order, Alert
+from models import db, Product, Inventory, Order, Alert, DailyProductSales
+from forecasting import FORECAST_HORIZONS, get_latest_forecasts
+from indicator_cache import prediction_indicators
 
 # Créer un blueprint pour les routes de prédiction
 prediction_bp = Blueprint('prediction', __name__, url_prefix='/api/prediction')
 
 
+# Fenêtre de calcul de la consommation et de la croissance (jours)
+SALES_PERIOD_DAYS = 30
+
+
 # Fonctions utilitaires
-def calculate_days_to_stockout(product_id, current_stock):
-    """Calcule le nombre estimé de jours avant rupture de stock"""
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    
-    total_ordered = db.session.query(func.sum(Order.quantity))\
-        .filter(
-            Order.product_id == product_id,
-            Order.order_date >= thirty_days_ago
-        ).scalar() or 0
-    
-    daily_consumption = total_ordered / 30 if total_ordered > 0 else 1
+def get_sales_metrics(product_ids=None, now=None):
+    """
+    Ventes de la période courante (30 derniers jours, aujourd'hui compris) et de la période précédente
+    pour tous les produits, en une seule requête groupée sur le cumul journalier (daily_product_sales).
+    Retourne {product_id: (ventes courantes, ventes précédentes)} ; un produit sans commande est absent.
+    """
+    today = (now or datetime.utcnow()).date()
+    current_start = today - timedelta(days=SALES_PERIOD_DAYS - 1)
+    previous_start = current_start - timedelta(days=SALES_PERIOD_DAYS)
+
+    query = db.session.query(
+        DailyProductSales.product_id,
+        func.sum(case((DailyProductSales.day >= current_start, DailyProductSales.quantity), else_=0)).label('current_sales'),
+        func.sum(case((DailyProductSales.day < current_start, DailyProductSales.quantity), else_=0)).label('previous_sales')
+    ).filter(
+        DailyProductSales.day >= previous_start,
+        DailyProductSales.day <= today
+    )
+    if product_ids is not None:
+        query = query.filter(DailyProductSales.product_id.in_(product_ids))
+
+    return {
+        product_id: (current_sales or 0, previous_sales or 0)
+        for product_id, current_sales, previous_sales in query.group_by(DailyProductSales.product_id).all()
+    }
+
+def estimate_days_to_stockout(current_stock, consumed):
+    """Nombre estimé de jours avant rupture, d'après la quantité commandée sur la période (max. 30)"""
+    daily_consumption = consumed / SALES_PERIOD_DAYS if consumed > 0 else 1
     days_left = int(current_stock / daily_consumption) if daily_consumption > 0 else 30
-    
     return min(days_left, 30)
 
-def calculate_growth_percentage(product_id):
-    """Calcule le pourcentage de croissance des ventes pour un produit"""
-    current_period_end = datetime.now()
-    current_period_start = current_period_end - timedelta(days=30)
-    previous_period_end = current_period_start
-    previous_period_start = previous_period_end - timedelta(days=30)
-    
-    current_sales = db.session.query(func.sum(Order.quantity))\
-        .filter(
-            Order.product_id == product_id,
-            Order.order_date >= current_period_start,
-            Order.order_date < current_period_end
-        ).scalar() or 0
-    
-    previous_sales = db.session.query(func.sum(Order.quantity))\
-        .filter(
-            Order.product_id == product_id,
-            Order.order_date >= previous_period_start,
-            Order.order_date < previous_period_end
-        ).scalar() or 0
-    
+def compute_growth_percentage(current_sales, previous_sales):
+    """Pourcentage de croissance des ventes entre la période précédente et la période courante"""
     if previous_sales > 0:
         growth = ((current_sales - previous_sales) / previous_sales) * 100
     else:
         growth = 100 if current_sales > 0 else 0
-    
     return round(growth, 2)
 
-def get_product_recommendation(product_id, current_stock, growth_percentage):
+def expected_consumption(product_forecasts, current_sales):
+    """
+    Quantité attendue sur les 30 prochains jours : prévision mensuelle précalculée (forecasting.py),
+    sinon les ventes des 30 derniers jours si aucune prévision n'a encore été calculée.
+    """
+    monthly = (product_forecasts or {}).get('monthly')
+    return monthly.predicted_quantity if monthly is not None else current_sales
+
+def calculate_days_to_stockout(product_id, current_stock):
+    """Calcule le nombre estimé de jours avant rupture de stock"""
+    forecasts = get_latest_forecasts([product_id]).get(product_id)
+    if forecasts and 'monthly' in forecasts:
+        return estimate_days_to_stockout(current_stock, expected_consumption(forecasts, 0))
+    current_sales, _ = get_sales_metrics([product_id]).get(product_id, (0, 0))
+    return estimate_days_to_stockout(current_stock, current_sales)
+
+def calculate_growth_percentage(product_id):
+    """Calcule le pourcentage de croissance des ventes pour un produit"""
+    return compute_growth_percentage(*get_sales_metrics([product_id]).get(product_id, (0, 0)))
+
+def product_stock_subquery():
+    """Stock total de chaque produit, toutes zones confondues"""
+    return db.session.query(
+        Inventory.product_id,
+        func.sum(Inventory.quantity).label('current_stock')
+    ).group_by(Inventory.product_id).subquery()
+
+def get_product_recommendation(product, current_stock, growth_percentage):
     """Génère une recommandation pour un produit en fonction de ses métriques"""
-    product = Product.query.get(product_id)
-    
     if current_stock < product.min_threshold:
         return "Réapprovisionnement urgent recommandé"
     
@@ -70,34 +98,42 @@ def get_product_recommendation(product_id, current_stock, growth_percentage):
 # Routes API
 @prediction_bp.route('/indicators', methods=['GET'])
 def get_prediction_indicators():
-    """Récupère toutes les données pour les indicateurs clés de la page Prediction"""
-    return jsonify({
+    """
+    Récupère toutes les données pour les indicateurs clés de la page Prediction.
+    Calculées au plus une fois par INDICATORS_CACHE_TTL (ou après une écriture qui les modifie),
+    quel que soit le nombre de tableaux de bord qui interrogent l'endpoint.
+    """
+    return jsonify(prediction_indicators.get_or_compute(compute_prediction_indicators))
+
+def compute_prediction_indicators():
+    return {
         "products_in_alert": get_products_in_alert(),
         "products_at_risk": get_products_at_risk(),
         "potential_products": get_potential_products(),
         "next_event": get_next_event()
-    })
+    }
 
 def get_products_in_alert():
     """Récupère les produits en alerte (stock < seuil minimal)"""
-    alert_products = db.session.query(Product, Inventory)\
-        .join(Inventory, Product.id == Inventory.product_id)\
-        .filter(Inventory.current_stock < Product.min_threshold)\
+    stock = product_stock_subquery()
+    alert_products = db.session.query(Product, stock.c.current_stock)\
+        .join(stock, Product.id == stock.c.product_id)\
+        .filter(stock.c.current_stock < Product.min_threshold)\
         .all()
     
     count = len(alert_products)
     progress_percentage = min(100, int(count / 30 * 100))
     
     products_list = []
-    for product, inventory in alert_products[:5]:
+    for product, current_stock in alert_products[:5]:
         products_list.append({
             "id": product.id,
-            "name": product.name,
-            "current_stock": inventory.current_stock,
+            "name": product.designation,
+            "current_stock": current_stock,
             "min_threshold": product.min_threshold
         })
     
-    product_names = [p.name for p, _ in alert_products[:3]]
+    product_names = [p.designation for p, _ in alert_products[:3]]
     displayed_names = ", ".join(product_names) + (" ..." if count > 3 else "")
     
     return {
@@ -109,23 +145,31 @@ def get_products_in_alert():
 
 def get_products_at_risk():
     """Récupère les produits à risque de rupture dans les 30 prochains jours"""
-    at_risk_products = db.session.query(Product, Inventory)\
-        .join(Inventory, Product.id == Inventory.product_id)\
-        .filter(Inventory.current_stock < Product.min_threshold * 1.2)\
+    stock = product_stock_subquery()
+    at_risk_products = db.session.query(Product, stock.c.current_stock)\
+        .join(stock, Product.id == stock.c.product_id)\
+        .filter(stock.c.current_stock < Product.min_threshold * 1.2)\
         .all()
     
     count = len(at_risk_products)
+    # Ventes et prévisions des produits affichés, en une requête chacune
+    displayed_ids = [product.id for product, _ in at_risk_products[:5]]
+    sales = get_sales_metrics(displayed_ids)
+    forecasts = get_latest_forecasts(displayed_ids)
     
     products_list = []
-    for product, inventory in at_risk_products[:5]:
+    for product, current_stock in at_risk_products[:5]:
+        current_sales, _ = sales.get(product.id, (0, 0))
         products_list.append({
             "id": product.id,
-            "name": product.name,
-            "current_stock": inventory.current_stock,
-            "estimated_days_left": calculate_days_to_stockout(product.id, inventory.current_stock)
+            "name": product.designation,
+            "current_stock": current_stock,
+            "estimated_days_left": estimate_days_to_stockout(
+                current_stock, expected_consumption(forecasts.get(product.id), current_sales)
+            )
         })
     
-    product_names = [p.name for p, _ in at_risk_products[:3]]
+    product_names = [p.designation for p, _ in at_risk_products[:3]]
     displayed_names = ", ".join(product_names) + (" ..." if count > 3 else "")
     
     return {
@@ -135,35 +179,37 @@ def get_products_at_risk():
     }
 
 def get_potential_products():
-    """Récupère les produits les plus demandés/potentiels"""
-    ninety_days_ago = datetime.now() - timedelta(days=90)
+    """Récupère les produits les plus demandés/potentiels (nombre de commandes sur 90 jours, cumul journalier)"""
+    ninety_days_ago = datetime.utcnow().date() - timedelta(days=90)
+    order_count = func.sum(DailyProductSales.order_count)
     
     top_products = db.session.query(
         Product, 
-        func.count(Order.id).label('order_count')
+        order_count.label('order_count')
     ).join(
-        Order, 
-        Product.id == Order.product_id
+        DailyProductSales, 
+        Product.id == DailyProductSales.product_id
     ).filter(
-        Order.order_date >= ninety_days_ago
+        DailyProductSales.day >= ninety_days_ago
     ).group_by(
         Product.id
     ).order_by(
-        func.count(Order.id).desc()
+        order_count.desc()
     ).limit(10).all()
     
     count = len(top_products)
+    sales = get_sales_metrics([product.id for product, _ in top_products[:5]])
     
     products_list = []
     for product, order_count in top_products[:5]:
         products_list.append({
             "id": product.id,
-            "name": product.name,
-            "order_count": order_count,
-            "growth_percentage": calculate_growth_percentage(product.id)
+            "name": product.designation,
+            "order_count": int(order_count),
+            "growth_percentage": compute_growth_percentage(*sales.get(product.id, (0, 0)))
         })
     
-    product_names = [p.name for p, _ in top_products[:3]]
+    product_names = [p.designation for p, _ in top_products[:3]]
     displayed_names = ", ".join(product_names) + (" ..." if count > 3 else "")
     
     return {
@@ -173,79 +219,108 @@ def get_potential_products():
     }
 
 def get_next_event():
-    """Récupère les informations sur le prochain événement"""
-    next_event = Event.query.filter(
-        Event.start_date > datetime.now()
-    ).order_by(
-        Event.start_date
-    ).first()
-    
-    if next_event:
-        if next_event.start_date.month == next_event.end_date.month and next_event.start_date.year == next_event.end_date.year:
-            date_display = next_event.start_date.strftime("%B %Y")
-        else:
-            date_display = f"{next_event.start_date.strftime('%B')}-{next_event.end_date.strftime('%B %Y')}"
-        
-        return {
-            "title": next_event.title,
-            "locations": next_event.locations,
-            "date": date_display,
-            "popular_products": next_event.popular_products
-        }
-    else:
-        return {
-            "title": "Aucun événement planifié",
-            "locations": "",
-            "date": "",
-            "popular_products": ""
-        }
+    """
+    Récupère les informations sur le prochain événement.
+    Aucune table d'événements n'existe encore dans models.py : l'indicateur affiche l'état vide.
+    """
+    return {
+        "title": "Aucun événement planifié",
+        "locations": "",
+        "date": "",
+        "popular_products": ""
+    }
 
 @prediction_bp.route('/products', methods=['GET'])
 def get_prediction_products():
-    """Récupère la liste des produits avec des données de prédiction"""
+    """
+    Récupère la liste des produits avec des données de prédiction.
+    Stock et ventes sont agrégés pour tous les produits à la fois : deux requêtes quel que soit
+    le nombre de produits.
+    """
     category_id = request.args.get('category_id', type=int)
     search_term = request.args.get('search', '')
     sort_by = request.args.get('sort_by', 'name')
     
-    query = db.session.query(Product, Inventory).\
-        join(Inventory, Product.id == Inventory.product_id)
+    # Stock total du produit, toutes zones confondues
+    stock = product_stock_subquery()
+
+    query = db.session.query(Product, stock.c.current_stock).\
+        join(stock, Product.id == stock.c.product_id)
     
     if category_id:
         query = query.filter(Product.category_id == category_id)
     
     if search_term:
-        query = query.filter(Product.name.ilike(f'%{search_term}%'))
+        query = query.filter(Product.designation.ilike(f'%{search_term}%'))
     
     if sort_by == 'stock':
-        query = query.order_by(Inventory.current_stock)
+        query = query.order_by(stock.c.current_stock)
     elif sort_by == 'name':
-        query = query.order_by(Product.name)
+        query = query.order_by(Product.designation)
     elif sort_by == 'risk':
-        query = query.order_by(Inventory.current_stock / Product.min_threshold)
+        query = query.order_by(stock.c.current_stock / Product.min_threshold)
     
     products = query.all()
+    sales = get_sales_metrics()
+    forecasts = get_latest_forecasts()
     
     result = []
-    for product, inventory in products:
-        days_to_stockout = calculate_days_to_stockout(product.id, inventory.current_stock)
-        growth_percentage = calculate_growth_percentage(product.id)
+    for product, current_stock in products:
+        current_stock = current_stock or 0
+        current_sales, previous_sales = sales.get(product.id, (0, 0))
+        product_forecasts = forecasts.get(product.id, {})
+        days_to_stockout = estimate_days_to_stockout(
+            current_stock, expected_consumption(product_forecasts, current_sales)
+        )
+        growth_percentage = compute_growth_percentage(current_sales, previous_sales)
         
         result.append({
             "id": product.id,
-            "name": product.name,
+            "name": product.designation,
             "category_id": product.category_id,
-            "current_stock": inventory.current_stock,
+            "current_stock": current_stock,
             "min_threshold": product.min_threshold,
             "max_threshold": product.max_threshold,
             "days_to_stockout": days_to_stockout,
-            "status": "alert" if inventory.current_stock < product.min_threshold else 
+            "status": "alert" if current_stock < product.min_threshold else 
                      "warning" if days_to_stockout < 30 else "normal",
             "growth_percentage": growth_percentage,
-            "recommendation": get_product_recommendation(product.id, inventory.current_stock, growth_percentage)
+            "recommendation": get_product_recommendation(product, current_stock, growth_percentage),
+            "forecast": {
+                period: product_forecasts[period].predicted_quantity if period in product_forecasts else None
+                for period in FORECAST_HORIZONS
+            }
         })
     
     return jsonify(result)
 
+@prediction_bp.route('/forecasts', methods=['GET'])
+def get_forecasts():
+    """
+    Dernières prévisions précalculées (tâche quotidienne de forecasting.py), filtrables par produit
+    et par période (daily, weekly, monthly)
+    """
+    product_id = request.args.get('product_id', type=int)
+    period = request.args.get('period')
+    if period and period not in FORECAST_HORIZONS:
+        return jsonify({"error": f"Période inconnue: {period}"}), 400
+
+    forecasts = get_latest_forecasts([product_id] if product_id else None)
+    result = []
+    for forecast_product_id, by_period in sorted(forecasts.items()):
+        for prediction in by_period.values():
+            if period and prediction.prediction_period != period:
+                continue
+            result.append({
+                "product_id": forecast_product_id,
+                "period": prediction.prediction_period,
+                "predicted_quantity": prediction.predicted_quantity,
+                "start": prediction.start_prediction.isoformat(),
+                "finish": prediction.finish_prediction.isoformat(),
+                "created_at": prediction.created_at.isoformat() if prediction.created_at else None
+            })
+    return jsonify(result)
+
 # Ajoutez d'autres routes selon vos besoins
 @prediction_bp.route('/analyze-product', methods=['POST'])
 def analyze_product():
@@ -0,0 +1,92 @@
+# read_cache.py
+from datetime import datetime, timedelta
+import threading
+
+# Fenêtre pendant laquelle les lectures d'un même UID complètent le même enregistrement
+DOOR_DEDUP_WINDOW = timedelta(minutes=5)
+# Granularité de l'expiration : les entrées sont libérées par tranches entières
+DEDUP_BUCKET_SECONDS = 10
+
+
+class RecentRead:
+    """Enregistrement SensorData courant d'un UID, tel qu'écrit en base"""
+    __slots__ = ('record_id', 'weight', 'value', 'saved_at', 'bucket')
+
+    def __init__(self, record_id, weight, value, saved_at, bucket):
+        self.record_id = record_id
+        self.weight = weight
+        self.value = value
+        self.saved_at = saved_at
+        self.bucket = bucket
+
+
+class RecentReadCache:
+    """
+    Cache en mémoire des lectures récentes par UID : une carte tenue devant le lecteur produit
+    des dizaines de lectures identiques par seconde, qui ne coûtent alors aucune requête.
+    - Seules la première lecture d'un UID et les changements de poids atteignent la base,
+      toujours sur le même enregistrement (par son id) pendant la fenêtre.
+    - Les entrées sont rangées par tranche de temps selon leur date d'enregistrement (saved_at)
+      et expirent avec leur tranche, comme la fenêtre de 5 minutes de la requête d'origine.
+    """
+
+    def __init__(self, ttl=DOOR_DEDUP_WINDOW, bucket_seconds=DEDUP_BUCKET_SECONDS):
+        self.ttl = ttl
+        self.bucket_seconds = bucket_seconds
+        self._entries = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, moment):
+        return int(moment.timestamp() // self.bucket_seconds)
+
+    def _evict(self, now):
+        """Libère les tranches entièrement sorties de la fenêtre"""
+        cutoff = self._bucket(now - self.ttl)
+        for bucket in [b for b in self._buckets if b < cutoff]:
+            for uid in self._buckets.pop(bucket):
+                entry = self._entries.get(uid)
+                if entry is not None and entry.bucket == bucket:
+                    del self._entries[uid]
+
+    def get(self, uid, now=None):
+        """Enregistrement courant de l'UID s'il est encore dans la fenêtre, sinon None"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(uid)
+            if entry is None or entry.saved_at < now - self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, uid, record_id, weight, value, saved_at):
+        """Mémorise l'enregistrement courant d'un UID (nouveau ou retrouvé en base)"""
+        bucket = self._bucket(saved_at)
+        entry = RecentRead(record_id, weight, value, saved_at, bucket)
+        with self._lock:
+            self._entries[uid] = entry
+            self._buckets.setdefault(bucket, set()).add(uid)
+        return entry
+
+    def update(self, uid, weight, value):
+        """Reflète une mise à jour du poids écrite en base"""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None:
+                entry.weight = weight
+                entry.value = value
+
+    def discard(self, uid):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Lectures récentes du lecteur de la porte, partagées par tous les lecteurs supervisés du processus
+recent_door_reads = RecentReadCache()
@@ -0,0 +1,70 @@
+# readings.py
+import json
+
+# Les lecteurs Arduino envoient le poids en grammes ; SensorData.weight est stocké en kg
+GRAMS_PER_KG = 1000
+
+# Origine d'une lecture (SensorData.source)
+SOURCE_DOOR = 'door'
+SOURCE_ZONE = 'zone'
+
+
+def normalize_uid(uid):
+    """UID RFID sans espaces, en majuscules (None si vide)"""
+    if uid is None:
+        return None
+    uid = str(uid).strip().upper()
+    return uid or None
+
+
+def grams_to_kg(weight_grams):
+    """Convertit un poids en grammes en kg (None si absent ou invalide)"""
+    if weight_grams is None:
+        return None
+    try:
+        return round(float(weight_grams) / GRAMS_PER_KG, 3)
+    except (ValueError, TypeError):
+        return None
+
+
+def extract_weight(data):
+    """Poids d'une trame décodée : à la racine ou dans data.weight"""
+    if not isinstance(data, dict):
+        return None
+    if 'weight' in data:
+        return data['weight']
+    if isinstance(data.get('data'), dict) and 'weight' in data['data']:
+        return data['data']['weight']
+    return None
+
+
+def frame_with_weight(value, weight):
+    """Trame brute avec le poids remplacé (gardée cohérente avec SensorData.weight), inchangée si illisible"""
+    try:
+        data = json.loads(value)
+        if "weight" in data:
+            data["weight"] = weight
+        elif isinstance(data.get("data"), dict):
+            data["data"]["weight"] = weight
+        return json.dumps(data)[:255]
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return value
+
+
+def parse_reading(value):
+    """
+    Extrait (uid, poids, zone_id) d'une valeur SensorData.value au format JSON.
+    Le poids est renvoyé tel qu'enregistré dans la trame. Retourne (None, None, None) si la valeur n'est pas du JSON.
+    """
+    try:
+        data = json.loads(value) if isinstance(value, str) else value
+    except (json.JSONDecodeError, TypeError):
+        return None, None, None
+    if not isinstance(data, dict):
+        return None, None, None
+    weight = extract_weight(data)
+    try:
+        weight = float(weight) if weight is not None else None
+    except (ValueError, TypeError):
+        weight = None
+    return normalize_uid(data.get('uid')), weight, data.get('zone_id')
@@ -0,0 +1,168 @@
+# rfid_ingest.py
+from datetime import datetime
+import json
+from models import db, SensorData
+from readings import normalize_uid, grams_to_kg, extract_weight, frame_with_weight, SOURCE_DOOR
+from door_scans import pending_door_scans
+from read_cache import recent_door_reads
+
+# Nombre maximal de lectures acceptées par requête groupée
+MAX_BULK_READINGS = 5000
+
+
+def parse_bulk_payload(request):
+    """
+    Extrait les lectures d'une requête groupée :
+    - tableau JSON : [{...}, {...}]
+    - objet JSON : {"readings": [{...}, ...]} (ou une seule lecture)
+    - NDJSON (Content-Type application/x-ndjson) : une lecture JSON par ligne
+    Retourne une liste de lectures ; une ligne NDJSON invalide donne {"_error": ...} à sa position.
+    """
+    if 'ndjson' in (request.content_type or ''):
+        readings = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                readings.append(json.loads(line))
+            except json.JSONDecodeError:
+                readings.append({'_error': 'JSON invalide', '_raw': line[:100]})
+        return readings
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        if isinstance(payload.get('readings'), list):
+            return payload['readings']
+        return [payload]
+    return []
+
+
+def _parse_timestamp(value):
+    """Horodatage de lecture fourni par la passerelle (ISO 8601), sinon maintenant"""
+    if value:
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', ''))
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+
+def _latest_door_records(uids, since):
+    """Dernier enregistrement de chaque UID depuis `since`, en une requête (index uid, saved_at)"""
+    rows = db.session.query(
+        SensorData.id, SensorData.uid, SensorData.weight, SensorData.value, SensorData.saved_at
+    ).filter(
+        SensorData.uid.in_(uids),
+        SensorData.saved_at >= since
+    ).order_by(SensorData.saved_at, SensorData.id).all()
+    return {row.uid: row for row in rows}
+
+
+def ingest_door_readings(readings):
+    """
+    Enregistre des lectures du lecteur de la porte avec la même déduplication que process_door_reading :
+    dans la fenêtre DOOR_DEDUP_WINDOW, seule la première lecture d'un UID crée un enregistrement et
+    un changement de poids met à jour cet enregistrement ; les autres lectures sont ignorées.
+    Enregistrement courant lu dans recent_door_reads, sinon une requête pour tous les UID absents.
+    Les nouveaux enregistrements sont écrits par une insertion multi-lignes.
+    Retourne (résultats par lecture, nombre de lectures acceptées : créées, mises à jour ou en double).
+    """
+    results = []
+    parsed = []
+    for index, reading in enumerate(readings):
+        if not isinstance(reading, dict) or '_error' in reading:
+            error = reading.get('_error') if isinstance(reading, dict) else 'Lecture invalide'
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+
+        uid = normalize_uid(reading.get('uid'))
+        if not uid:
+            results.append({'index': index, 'status': 'error', 'error': 'UID RFID manquant'})
+            continue
+
+        result = {'index': index, 'uid': uid}
+        results.append(result)
+        parsed.append((result, uid, grams_to_kg(extract_weight(reading)),
+                       _parse_timestamp(reading.get('timestamp')), json.dumps(reading)[:255]))
+    if not parsed:
+        return results, 0
+
+    # Enregistrement courant de chaque UID : {'id' (absent si nouveau), 'weight', 'value', 'saved_at'}
+    current = {}
+    missing = {}
+    for _, uid, _, saved_at, _ in parsed:
+        if uid in current or uid in missing:
+            continue
+        entry = recent_door_reads.get(uid, saved_at)
+        if entry is not None:
+            current[uid] = {'id': entry.record_id, 'weight': entry.weight, 'value': entry.value, 'saved_at': entry.saved_at}
+        else:
+            missing[uid] = saved_at
+    if missing:
+        since = min(missing.values()) - recent_door_reads.ttl
+        for uid, record in _latest_door_records(set(missing), since).items():
+            current[uid] = {'id': record.id, 'weight': record.weight, 'value': record.value, 'saved_at': record.saved_at}
+
+    rows = []
+    updated = {}
+    for result, uid, weight, saved_at, value in parsed:
+        state = current.get(uid)
+        if state is None or state['saved_at'] < saved_at - recent_door_reads.ttl:
+            row = {
+                'value': value,
+                'saved_at': saved_at,
+                'stored': False,
+                'uid': uid,
+                'weight': weight,
+                'source': SOURCE_DOOR
+            }
+            rows.append(row)
+            current[uid] = row
+            result['status'] = 'created'
+        elif weight is None or weight == state['weight']:
+            result['status'] = 'duplicate'
+        else:
+            # Même enregistrement, poids mis à jour (ligne existante, ou ligne du lot pas encore insérée)
+            state['weight'] = weight
+            state['value'] = frame_with_weight(state['value'], weight)
+            if 'id' in state:
+                updated[uid] = state
+            result['status'] = 'updated'
+
+    if rows:
+        # executemany : PyMySQL regroupe les lignes en un seul INSERT ... VALUES (...), (...)
+        db.session.execute(SensorData.__table__.insert(), rows)
+    if updated:
+        db.session.bulk_update_mappings(SensorData, [
+            {'id': state['id'], 'weight': state['weight'], 'value': state['value']} for state in updated.values()
+        ])
+    if rows or updated:
+        db.session.commit()
+
+    for uid, state in current.items():
+        if 'id' in state:
+            recent_door_reads.put(uid, state['id'], state['weight'], state['value'], state['saved_at'])
+    for uid, state in updated.items():
+        pending_door_scans.update_weight(uid, state['id'], state['weight'])
+    if rows:
+        # Ids attribués par l'insertion groupée : relus en une requête pour le cache
+        new_uids = {row['uid'] for row in rows}
+        since = min(row['saved_at'] for row in rows)
+        for uid, record in _latest_door_records(new_uids, since).items():
+            recent_door_reads.put(uid, record.id, record.weight, record.value, record.saved_at)
+        # Les scans en attente de ces UID seront relus en base
+        for uid in new_uids:
+            pending_door_scans.invalidate(uid)
+    return results, len(parsed)
+
+
+def bulk_status_code(created, total):
+    """201 si tout est enregistré, 207 si une partie seulement, 400 si rien"""
+    if total and created == total:
+        return 201
+    if created:
+        return 207
+    return 400
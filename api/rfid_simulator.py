@@ -0,0 +1,401 @@
+# rfid_simulator.py
+"""
+Simulateur de trafic RFID pour les tests de charge, sans Arduino.
+
+Génère des trames identiques à celles des sketches (arduino_rfid_sensor.ino pour la porte,
+sketch_may18a_zones.ino pour les zones), de façon déterministe (--seed), et les écrit :
+- sur des pseudo-terminaux (pty) : déclarer leurs chemins comme ports des lecteurs (rfid_readers)
+  pour mesurer la lecture série et le superviseur ;
+- directement sur les endpoints HTTP (porte, /api/zone-rfid/data, /api/process-zone-scan),
+  à l'unité ou par lots (endpoints /bulk).
+
+Exemples :
+    python rfid_simulator.py generate --target pty --rate 20 --duration 60 --duplicates 10
+    python rfid_simulator.py generate --target http --rate 50 --count 1000 --batch 50
+    python rfid_simulator.py generate --target http --zone-endpoint zone-scan --token <JWT>
+    python rfid_simulator.py record --port COM4 --output porte.capture
+    python rfid_simulator.py replay porte.capture --target pty --speed 4
+
+Format des captures : une ligne par trame reçue, "secondes depuis le début<TAB>trame".
+Une ligne sans horodatage est rejouée au rythme de --rate.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import requests
+
+# UID des badges réels (section hexadécimale du fichier, avant la ligne "=====")
+DEFAULT_UIDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino_rfid_sensor', 'rfid-ids.txt')
+DEFAULT_API_URL = 'http://localhost:5000'
+
+CHANNEL_DOOR = 'door'
+CHANNEL_ZONE = 'zone'
+
+# Endpoints HTTP par canal : (unitaire, groupé)
+DOOR_ENDPOINTS = ('/api/rfid/data', '/api/rfid/data/bulk')
+ZONE_ENDPOINTS = {
+    'zone-rfid': ('/api/zone-rfid/data', '/api/zone-rfid/data/bulk'),
+    'zone-scan': ('/api/process-zone-scan', None),
+}
+
+
+def load_uids(path):
+    """UID au format envoyé par les Arduino : octets hexadécimaux sur 2 caractères, en majuscules"""
+    uids = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('='):
+                # La suite du fichier reprend les mêmes badges en décimal
+                break
+            if line:
+                uids.append(''.join(part.zfill(2) for part in line.upper().split()))
+    return uids
+
+
+def door_frame(uid, weight_grams, data):
+    """Trame de arduino_rfid_sensor.ino"""
+    return {'uid': uid, 'weight': round(weight_grams, 2), 'data': data}
+
+
+def zone_frame(uid, weight_grams, zone_id, data, millis):
+    """Trame de sketch_may18a_zones.ino"""
+    return {
+        'uid': uid,
+        'weight': round(weight_grams, 2),
+        'zone_id': zone_id,
+        'data': data,
+        'timestamp': millis,
+        'reader_type': 'zone'
+    }
+
+
+def generate_events(args):
+    """
+    Liste déterministe d'événements (instant en secondes, canal, trame), triée par instant.
+    Chaque scan de porte peut être répété (--duplicates, badge tenu devant le lecteur)
+    puis suivi d'un scan en zone (--zone-ratio) après --zone-delay secondes.
+    """
+    rng = random.Random(args.seed)
+    uids = load_uids(args.uids_file)
+    uids += ['%08X' % rng.getrandbits(32) for _ in range(args.extra_uids)]
+    if not uids:
+        raise SystemExit("Aucun UID disponible (--uids-file, --extra-uids)")
+    products = {uid: (index + 1, 20.0 + rng.random() * 4980.0) for index, uid in enumerate(uids)}
+
+    count = args.count if args.count else int(args.rate * args.duration)
+    interval = 1.0 / args.rate
+    events = []
+    moment = 0.0
+    for _ in range(count):
+        uid = rng.choice(uids)
+        product_id, weight = products[uid]
+        data = f"{product_id}:Produit {product_id}:0"
+
+        # Rafale de lectures identiques ; le poids peut se stabiliser pendant la rafale
+        burst = 1 + (rng.randint(0, args.duplicates) if args.duplicates else 0)
+        for repeat in range(burst):
+            reading_weight = weight + (rng.uniform(-args.settle_grams, args.settle_grams) if repeat < burst - 1 else 0)
+            events.append((moment + repeat * args.burst_interval, CHANNEL_DOOR,
+                           door_frame(uid, reading_weight, data)))
+
+        if rng.random() < args.zone_ratio:
+            zone_moment = moment + args.zone_delay + rng.uniform(0, args.zone_delay)
+            if rng.random() < args.mismatch_ratio:
+                # Produit différent de celui scanné à la porte
+                uid = rng.choice(uids)
+            zone_weight = weight * (1 + rng.uniform(-args.weight_jitter, args.weight_jitter))
+            events.append((zone_moment, CHANNEL_ZONE,
+                           zone_frame(uid, zone_weight, rng.choice(args.zone_ids), data, int(zone_moment * 1000))))
+
+        # Arrivées poissonniennes autour du débit demandé
+        moment += rng.expovariate(1.0 / interval) if args.poisson else interval
+
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def load_capture(path, channel, rate):
+    """Événements d'une capture enregistrée par la commande record"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            offset, sep, frame = line.partition('\t')
+            try:
+                moment = float(offset) if sep else None
+            except ValueError:
+                moment = None
+            if moment is None:
+                # Ligne sans horodatage
+                frame = line
+                moment = (events[-1][0] if events else 0.0) + 1.0 / rate
+            events.append((moment, channel or detect_channel(frame), frame))
+    return events
+
+
+def detect_channel(frame):
+    """Canal d'une trame rejouée : les lecteurs de zone envoient zone_id et reader_type"""
+    try:
+        data = json.loads(frame)
+    except json.JSONDecodeError:
+        return CHANNEL_DOOR
+    if isinstance(data, dict) and (data.get('reader_type') == 'zone' or 'zone_id' in data):
+        return CHANNEL_ZONE
+    return CHANNEL_DOOR
+
+
+class Stats:
+    """Compteurs et latences du test"""
+
+    def __init__(self):
+        self.sent = {CHANNEL_DOOR: 0, CHANNEL_ZONE: 0}
+        self.requests = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.latencies = []
+        self.max_lag = 0.0
+        self.started = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        total = sum(self.sent.values())
+        print("\n📊 Résultats de la simulation")
+        print(f"Durée: {elapsed:.2f}s, trames envoyées: {total} "
+              f"(porte: {self.sent[CHANNEL_DOOR]}, zone: {self.sent[CHANNEL_ZONE]}), débit: {total / elapsed if elapsed else 0:.1f}/s")
+        print(f"Retard maximal sur le planning: {self.max_lag * 1000:.1f} ms")
+        if self.requests:
+            print(f"Requêtes HTTP: {self.requests}, erreurs: {self.errors}, codes: {self.status_codes}")
+            latencies = sorted(self.latencies)
+            def percentile(p):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+            print(f"Latence (ms): moyenne {statistics.mean(latencies) * 1000:.1f}, p50 {percentile(0.5):.1f}, "
+                  f"p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, max {latencies[-1] * 1000:.1f}")
+
+
+class PtyTarget:
+    """Un pseudo-terminal par canal ; le lecteur (ou le superviseur) ouvre le côté esclave"""
+
+    def __init__(self, stats):
+        # Unix seulement : importé ici pour que les cibles http et la capture restent utilisables sous Windows
+        import tty
+        self.stats = stats
+        self.ptys = {}
+        for channel in (CHANNEL_DOOR, CHANNEL_ZONE):
+            master, slave = os.openpty()
+            # Pas d'écho ni de transformation des fins de ligne
+            tty.setraw(slave)
+            self.ptys[channel] = (master, slave)
+            print(f"🔌 Lecteur {channel}: {os.ttyname(slave)}")
+
+    def send(self, channel, frame):
+        line = frame if isinstance(frame, str) else json.dumps(frame, separators=(',', ':'))
+        os.write(self.ptys[channel][0], (line + '\r\n').encode('utf-8'))
+        self.stats.sent[channel] += 1
+
+    def close(self):
+        for master, slave in self.ptys.values():
+            os.close(master)
+            os.close(slave)
+
+
+class HttpTarget:
+    """
+    Envoi direct aux endpoints, sur une session keep-alive. Avec --batch, les trames consécutives
+    d'un même canal partent par lots ; le lot en attente d'un canal est envoyé avant toute trame
+    de l'autre canal pour garder l'ordre porte -> zone.
+    """
+
+    def __init__(self, stats, api_url, zone_endpoint, batch, batch_delay, token):
+        self.stats = stats
+        self.api_url = api_url.rstrip('/')
+        self.zone_endpoint = zone_endpoint
+        self.endpoints = {CHANNEL_DOOR: DOOR_ENDPOINTS, CHANNEL_ZONE: ZONE_ENDPOINTS[zone_endpoint]}
+        self.batch = batch
+        self.batch_delay = batch_delay
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+        self.pending = {CHANNEL_DOOR: [], CHANNEL_ZONE: []}
+        self.pending_since = {}
+
+    def _payload(self, channel, frame):
+        if isinstance(frame, str):
+            frame = json.loads(frame)
+        if channel == CHANNEL_ZONE and self.zone_endpoint == 'zone-scan':
+            # process_zone_scan attend le tag et le poids en kg
+            return {'rfid_tag': frame['uid'], 'weight': round(frame['weight'] / 1000, 3), 'zone_id': frame.get('zone_id')}
+        return frame
+
+    def _post(self, path, payload):
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.api_url + path, json=payload, timeout=30)
+            code = response.status_code
+            if code >= 400 and code != 404:
+                self.stats.errors += 1
+        except requests.RequestException as e:
+            code = type(e).__name__
+            self.stats.errors += 1
+        self.stats.latencies.append(time.perf_counter() - started)
+        self.stats.requests += 1
+        self.stats.status_codes[code] = self.stats.status_codes.get(code, 0) + 1
+
+    def _flush(self, channel):
+        pending = self.pending[channel]
+        if pending:
+            self._post(self.endpoints[channel][1], pending)
+            self.stats.sent[channel] += len(pending)
+            self.pending[channel] = []
+
+    def send(self, channel, frame):
+        if isinstance(frame, str) and not frame.startswith('{'):
+            # Messages d'état des sketches (« System ready... ») : sans équivalent HTTP
+            return
+        payload = self._payload(channel, frame)
+        bulk_path = self.endpoints[channel][1]
+        if self.batch <= 1 or not bulk_path:
+            for other in self.pending:
+                self._flush(other)
+            self._post(self.endpoints[channel][0], payload)
+            self.stats.sent[channel] += 1
+            return
+
+        other = CHANNEL_ZONE if channel == CHANNEL_DOOR else CHANNEL_DOOR
+        self._flush(other)
+        if not self.pending[channel]:
+            self.pending_since[channel] = time.perf_counter()
+        self.pending[channel].append(payload)
+        if len(self.pending[channel]) >= self.batch or \
+                time.perf_counter() - self.pending_since[channel] >= self.batch_delay:
+            self._flush(channel)
+
+    def close(self):
+        for channel in self.pending:
+            self._flush(channel)
+        self.session.close()
+
+
+def play(events, target, stats, speed):
+    """Envoie chaque événement à son instant planifié (divisé par --speed)"""
+    start = time.perf_counter()
+    for moment, channel, frame in events:
+        due = start + moment / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            stats.max_lag = max(stats.max_lag, -delay)
+        target.send(channel, frame)
+
+
+def make_target(args, stats):
+    if args.target == 'pty':
+        target = PtyTarget(stats)
+        if args.startup_delay:
+            print(f"⏳ Démarrage dans {args.startup_delay}s (connecter les lecteurs aux ports ci-dessus)")
+            time.sleep(args.startup_delay)
+        return target
+    return HttpTarget(stats, args.api_url, args.zone_endpoint, args.batch, args.batch_delay, args.token)
+
+
+def run_events(args, events):
+    print(f"▶️ {len(events)} trames à envoyer ({args.target})")
+    stats = Stats()
+    target = make_target(args, stats)
+    stats.started = time.perf_counter()
+    try:
+        play(events, target, stats, args.speed)
+    except KeyboardInterrupt:
+        print("Simulation interrompue par l'utilisateur")
+    finally:
+        if args.target == 'pty' and args.drain_delay:
+            # Laisser le lecteur consommer les dernières trames avant de fermer les ports
+            time.sleep(args.drain_delay)
+        target.close()
+    stats.report()
+
+
+def record(args):
+    """Enregistre les trames d'un vrai lecteur dans une capture rejouable"""
+    from serial_reader import SerialLineReader
+    reader = SerialLineReader(args.port, args.baud_rate)
+    reader.start()
+    print(f"⏺️ Enregistrement de {args.port} dans {args.output} (Ctrl+C pour arrêter)")
+    start = time.perf_counter()
+    count = 0
+    try:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for line in reader.read_lines():
+                f.write(f"{time.perf_counter() - start:.3f}\t{line}\n")
+                f.flush()
+                count += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stop()
+    print(f"✅ {count} trames enregistrées")
+
+
+def add_target_arguments(parser):
+    parser.add_argument('--target', choices=['pty', 'http'], default='pty')
+    parser.add_argument('--speed', type=float, default=1.0, help="Accélération du planning (2 = deux fois plus vite)")
+    parser.add_argument('--api-url', default=DEFAULT_API_URL)
+    parser.add_argument('--zone-endpoint', choices=sorted(ZONE_ENDPOINTS), default='zone-rfid',
+                        help="zone-rfid : /api/zone-rfid/data, zone-scan : /api/process-zone-scan (JWT requis)")
+    parser.add_argument('--token', help="JWT envoyé en en-tête Authorization")
+    parser.add_argument('--batch', type=int, default=1, help="Trames par requête (endpoints /bulk)")
+    parser.add_argument('--batch-delay', type=float, default=0.5, help="Attente maximale d'un lot (s)")
+    parser.add_argument('--startup-delay', type=float, default=5.0, help="Attente avant l'envoi en mode pty (s)")
+    parser.add_argument('--drain-delay', type=float, default=2.0, help="Attente avant la fermeture des pty (s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulateur de trafic RFID (porte et zones)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Générer un trafic synthétique déterministe")
+    add_target_arguments(generate)
+    generate.add_argument('--seed', type=int, default=42)
+    generate.add_argument('--rate', type=float, default=5.0, help="Scans de porte par seconde")
+    generate.add_argument('--duration', type=float, default=30.0, help="Durée du planning (s)")
+    generate.add_argument('--count', type=int, help="Nombre de scans de porte (remplace --duration)")
+    generate.add_argument('--poisson', action='store_true', help="Intervalles aléatoires (exponentiels) entre scans")
+    generate.add_argument('--duplicates', type=int, default=0, help="Lectures répétées maximales par scan")
+    generate.add_argument('--burst-interval', type=float, default=0.05, help="Intervalle entre lectures répétées (s)")
+    generate.add_argument('--settle-grams', type=float, default=0.0, help="Variation du poids pendant une rafale (g)")
+    generate.add_argument('--zone-ratio', type=float, default=0.8, help="Part des scans suivis d'un scan en zone")
+    generate.add_argument('--zone-delay', type=float, default=2.0, help="Délai porte -> zone (s)")
+    generate.add_argument('--zone-ids', type=lambda value: [int(v) for v in value.split(',')], default=[1])
+    generate.add_argument('--weight-jitter', type=float, default=0.02, help="Écart relatif du poids en zone")
+    generate.add_argument('--mismatch-ratio', type=float, default=0.0, help="Part des scans en zone d'un autre produit")
+    generate.add_argument('--uids-file', default=DEFAULT_UIDS_FILE)
+    generate.add_argument('--extra-uids', type=int, default=0, help="UID aléatoires en plus des badges réels")
+
+    replay = commands.add_parser('replay', help="Rejouer une capture enregistrée")
+    replay.add_argument('capture')
+    add_target_arguments(replay)
+    replay.add_argument('--channel', choices=[CHANNEL_DOOR, CHANNEL_ZONE],
+                        help="Canal de toutes les trames (détecté par trame sinon)")
+    replay.add_argument('--rate', type=float, default=5.0, help="Débit des lignes sans horodatage")
+
+    rec = commands.add_parser('record', help="Enregistrer les trames d'un lecteur réel")
+    rec.add_argument('--port', required=True)
+    rec.add_argument('--baud-rate', type=int, default=9600)
+    rec.add_argument('--output', required=True)
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        run_events(args, generate_events(args))
+    elif args.command == 'replay':
+        run_events(args, load_capture(args.capture, args.channel, args.rate))
+    else:
+        record(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# rfid_supervisor.py
+from datetime import datetime, timedelta
+import logging
+import threading
+import serial
+from models import db, RFIDReader
+from serial_reader import SerialLineReader
+
+# Rôles de lecteur reconnus
+ROLE_DOOR = 'door'
+ROLE_ZONE = 'zone'
+READER_ROLES = (ROLE_DOOR, ROLE_ZONE)
+
+# Reconnexion après une erreur de port : attente doublée à chaque échec, entre ces bornes (secondes)
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+
+def is_local_port(port):
+    """
+    Port série local (COM4, /dev/ttyUSB0). Les URL pyserial (socket://, rfc2217://, ...) sont refusées :
+    elles feraient ouvrir des connexions réseau arbitraires au serveur.
+    """
+    return bool(port) and '://' not in port
+
+
+def reader_config(reader):
+    """Copie de la configuration d'un lecteur, utilisable hors session"""
+    return {
+        'id': reader.id,
+        'name': reader.name,
+        'port': reader.port,
+        'baud_rate': reader.baud_rate,
+        'role': reader.role,
+        'zone_id': reader.zone_id,
+        'enabled': reader.enabled
+    }
+
+
+class ReaderWorker:
+    """
+    Un lecteur supervisé : un thread ouvre le port, remet chaque ligne au traitement de son rôle
+    et rouvre le port avec une attente croissante si la connexion tombe.
+    """
+
+    def __init__(self, app, config, handler):
+        self.app = app
+        self.config = config
+        self.handler = handler
+        self.reader = None
+        self.thread = None
+        self._stop_event = threading.Event()
+        # État de santé exposé par l'API
+        self.state = 'stopped'  # stopped, connecting, running, backoff
+        self.started_at = None
+        self.connected_at = None
+        self.last_line_at = None
+        self.lines_processed = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.next_retry_at = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return False
+        self._stop_event.clear()
+        self.started_at = datetime.utcnow()
+        self.thread = threading.Thread(target=self._run, name=f"rfid-{self.config['name']}", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if not self.is_running:
+            return False
+        self._stop_event.set()
+        if self.reader:
+            # Ferme le port : read_lines() se termine
+            self.reader.stop()
+        self.thread.join(timeout=5)
+        return True
+
+    def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while not self._stop_event.is_set():
+            self.state = 'connecting'
+            reader = SerialLineReader(self.config['port'], self.config['baud_rate'])
+            try:
+                reader.start()
+            except serial.SerialException as e:
+                self._record_error(f"Connexion impossible: {e}")
+            else:
+                self.reader = reader
+                if self._stop_event.is_set():
+                    # stop() appelé pendant l'ouverture du port
+                    reader.stop()
+                    break
+                self.state = 'running'
+                self.connected_at = datetime.utcnow()
+                self.next_retry_at = None
+                delay = RECONNECT_MIN_DELAY
+                logging.info(f"✅ Lecteur RFID {self.config['name']} connecté sur {self.config['port']}")
+
+                for line in reader.read_lines():
+                    self._handle(line)
+
+                self.reader = None
+                if self._stop_event.is_set():
+                    break
+                self._record_error(reader.last_error or "Connexion série interrompue")
+
+            # Nouvelle tentative après une attente croissante (interrompue par stop())
+            self.reconnects += 1
+            self.state = 'backoff'
+            self.next_retry_at = datetime.utcnow() + timedelta(seconds=delay)
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+        self.state = 'stopped'
+        self.next_retry_at = None
+        logging.info(f"ℹ️ Lecteur RFID {self.config['name']} arrêté")
+
+    def _handle(self, line):
+        self.last_line_at = datetime.utcnow()
+        with self.app.app_context():
+            try:
+                self.handler(line, self.config)
+                self.lines_processed += 1
+            except Exception as e:
+                db.session.rollback()
+                self.errors += 1
+                self.last_error = f"Traitement de la ligne: {e}"
+                logging.exception(f"❌ Lecteur RFID {self.config['name']}: erreur de traitement de '{line}'")
+
+    def _record_error(self, message):
+        self.errors += 1
+        self.last_error = message
+        logging.warning(f"❌ Lecteur RFID {self.config['name']} ({self.config['port']}): {message}")
+
+    def status(self):
+        return dict(
+            self.config,
+            state=self.state,
+            started_at=self.started_at.isoformat() if self.started_at else None,
+            connected_at=self.connected_at.isoformat() if self.connected_at else None,
+            last_line_at=self.last_line_at.isoformat() if self.last_line_at else None,
+            lines_processed=self.lines_processed,
+            errors=self.errors,
+            reconnects=self.reconnects,
+            last_error=self.last_error,
+            next_retry_at=self.next_retry_at.isoformat() if self.next_retry_at else None
+        )
+
+
+class RFIDSupervisor:
+    """
+    Gère les lecteurs RFID déclarés dans la table rfid_readers : un thread par port,
+    reconnexion automatique et état de santé par lecteur.
+    Le traitement des lignes dépend du rôle du lecteur (voir init_app()).
+    """
+
+    def __init__(self):
+        self.app = None
+        self._handlers = {}
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, handlers):
+        """handlers : {rôle: fonction(ligne, configuration du lecteur)}, appelée dans le contexte de l'application"""
+        self.app = app
+        self._handlers = dict(handlers)
+
+    def start(self, reader):
+        """Démarre un lecteur (modèle RFIDReader). Retourne False s'il tournait déjà."""
+        if reader.role not in self._handlers:
+            raise ValueError(f"Rôle de lecteur inconnu: {reader.role}")
+        if not is_local_port(reader.port):
+            raise ValueError(f"Port série refusé (URL): {reader.port}")
+        config = reader_config(reader)
+        with self._lock:
+            worker = self._workers.get(reader.name)
+            if worker and worker.is_running:
+                return False
+            # Configuration relue à chaque démarrage (port ou zone modifiés entre-temps)
+            worker = ReaderWorker(self.app, config, self._handlers[reader.role])
+            self._workers[reader.name] = worker
+            return worker.start()
+
+    def stop(self, name):
+        """Arrête un lecteur. Retourne False s'il n'était pas démarré."""
+        with self._lock:
+            worker = self._workers.get(name)
+        return worker.stop() if worker else False
+
+    def start_all(self):
+        """Démarre tous les lecteurs activés (à appeler dans le contexte de l'application)"""
+        started = []
+        for reader in RFIDReader.query.filter_by(enabled=True).order_by(RFIDReader.id).all():
+            try:
+                if self.start(reader):
+                    started.append(reader.name)
+            except ValueError as e:
+                logging.warning(f"❌ Lecteur RFID {reader.name} non démarré: {e}")
+        return started
+
+    def stop_all(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.stop()
+
+    def is_running(self, name):
+        worker = self._workers.get(name)
+        return bool(worker and worker.is_running)
+
+    def status(self, reader):
+        """État de santé d'un lecteur configuré (modèle RFIDReader)"""
+        worker = self._workers.get(reader.name)
+        if worker is None:
+            return dict(reader_config(reader), state='stopped')
+        # La configuration affichée est celle utilisée par le thread en cours
+        return worker.status()
+
+
+# Superviseur partagé par le processus
+rfid_supervisor = RFIDSupervisor()
@@ -0,0 +1,98 @@
+# sales_rollup.py
+from collections import defaultdict
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, DailyProductSales, Order
+
+
+def _upsert_statement(rows, dialect):
+    """
+    INSERT multi-lignes qui cumule quantité et nombre de commandes des lignes (product_id, day) existantes :
+    INSERT ... ON DUPLICATE KEY UPDATE sous MySQL.
+    """
+    table = DailyProductSales.__table__
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.product_id, table.c.day],
+            set_={
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'order_count': table.c.order_count + stmt.excluded.order_count
+            }
+        )
+    stmt = mysql.insert(table).values(rows)
+    return stmt.on_duplicate_key_update(
+        quantity=table.c.quantity + stmt.inserted.quantity,
+        order_count=table.c.order_count + stmt.inserted.order_count
+    )
+
+
+def sales_key(order):
+    """Ligne du cumul d'une commande : (product_id, jour de création)"""
+    return order.product_id, order.created_at.date()
+
+
+def add_daily_sales(deltas):
+    """
+    Ajoute des ventes au cumul journalier en une instruction, sans lecture préalable.
+    - deltas : itérable de (product_id, jour, quantité, nombre de commandes), valeurs négatives
+      pour retirer des commandes
+    Les jours qui n'ont plus aucune commande sont supprimés. Le commit revient à l'appelant.
+    """
+    merged = defaultdict(lambda: [0, 0])
+    for product_id, day, quantity, order_count in deltas:
+        merged[(product_id, day)][0] += quantity
+        merged[(product_id, day)][1] += order_count
+    rows = [
+        {'product_id': product_id, 'day': day, 'quantity': quantity, 'order_count': order_count}
+        for (product_id, day), (quantity, order_count) in sorted(merged.items())
+        if quantity or order_count
+    ]
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    db.session.execute(_upsert_statement(rows, dialect))
+    removed = [(row['product_id'], row['day']) for row in rows if row['order_count'] < 0]
+    if removed:
+        DailyProductSales.query.filter(
+            tuple_(DailyProductSales.product_id, DailyProductSales.day).in_(removed),
+            DailyProductSales.order_count <= 0
+        ).delete(synchronize_session=False)
+
+
+def record_order_created(order):
+    """À appeler après le flush de la commande (created_at renseigné)"""
+    add_daily_sales([sales_key(order) + (order.quantity, 1)])
+
+
+def record_order_updated(order, previous_quantity):
+    """Reporte le changement de quantité d'une commande existante"""
+    if order.quantity != previous_quantity:
+        add_daily_sales([sales_key(order) + (order.quantity - previous_quantity, 0)])
+
+
+def record_order_deleted(order):
+    add_daily_sales([sales_key(order) + (-order.quantity, -1)])
+
+
+def remove_product_sales(product_id):
+    """Supprime le cumul d'un produit (suppression du produit et de ses commandes)"""
+    return DailyProductSales.query.filter_by(product_id=product_id).delete(synchronize_session=False)
+
+
+def rebuild_daily_sales():
+    """Recalcule tout le cumul à partir des commandes (INSERT ... SELECT groupé, une seule lecture)"""
+    table = DailyProductSales.__table__
+    order_day = func.date(Order.created_at)
+    grouped = select(
+        Order.product_id,
+        order_day,
+        func.sum(Order.quantity),
+        func.count(Order.id)
+    ).where(Order.created_at.isnot(None)).group_by(Order.product_id, order_day)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['product_id', 'day', 'quantity', 'order_count'], grouped
+    ))
@@ -0,0 +1,88 @@
+# serial_reader.py
+import queue
+import threading
+import serial
+
+# Marqueur de fin de flux déposé dans la file à l'arrêt du lecteur
+_END_OF_STREAM = object()
+
+
+class SerialLineReader:
+    """
+    Lecteur série partagé : un thread bloque sur le port (pas de boucle d'attente active),
+    lit à chaque réveil tout ce qui est disponible et dépose chaque ligne complète dans une file.
+    - port : nom du port (COM4, /dev/ttyUSB0) ou URL pyserial ; le côté esclave d'un pty
+      (os.openpty) peut remplacer l'Arduino pour les tests.
+    - line_queue : file bornée consommée par le traitement (read_lines()).
+    """
+
+    def __init__(self, port, baud_rate=9600, read_timeout=1.0, max_queued_lines=10000, serial_factory=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.read_timeout = read_timeout
+        self.line_queue = queue.Queue(maxsize=max_queued_lines)
+        self.serial_connection = None
+        self.is_running = False
+        self.thread = None
+        self.last_error = None
+        self.lines_read = 0
+        self._serial_factory = serial_factory or self._open_serial
+
+    def _open_serial(self):
+        return serial.serial_for_url(self.port, self.baud_rate, timeout=self.read_timeout)
+
+    def start(self):
+        """Ouvre le port et démarre le thread de lecture. Lève serial.SerialException en cas d'échec."""
+        if self.is_running:
+            return False
+        self.serial_connection = self._serial_factory()
+        self.is_running = True
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """Arrête la lecture et ferme le port ; les consommateurs de read_lines() se terminent"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self.serial_connection and self.serial_connection.is_open:
+            # Débloque la lecture en cours
+            self.serial_connection.close()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def _read_loop(self):
+        buffer = b''
+        try:
+            while self.is_running:
+                try:
+                    # Bloque jusqu'au premier octet (ou au timeout), puis vide tout ce qui est disponible
+                    chunk = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+                except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                    if self.is_running:
+                        self.last_error = str(e)
+                        print(f"❌ Erreur de lecture sur {self.port}: {e}")
+                    break
+
+                if not chunk:
+                    continue
+
+                buffer += chunk
+                *complete_lines, buffer = buffer.split(b'\n')
+                for raw_line in complete_lines:
+                    line = raw_line.decode('utf-8', errors='replace').strip()
+                    if line:
+                        self.lines_read += 1
+                        self.line_queue.put(line)
+        finally:
+            self.is_running = False
+            self.line_queue.put(_END_OF_STREAM)
+
+    def read_lines(self):
+        """Générateur des lignes reçues, bloquant jusqu'à la suivante ; s'arrête avec le lecteur"""
+        while True:
+            line = self.line_queue.get()
+            if line is _END_OF_STREAM:
+                return
+            yield line
@@ -1,66 +1,258 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import serial
 import requests
-import json
-import time
+from requests.adapters import HTTPAdapter
+from serial_reader import SerialLineReader
 
 # Configurez le port série (adapté à votre configuration)
 PORT = 'COM4'  # Changez selon votre port Arduino
 BAUD_RATE = 9600
 
 # URL de votre API Flask
-API_URL = "http://localhost:5000/api/rfid/data"
+BULK_API_URL = "http://localhost:5000/api/rfid/data/bulk"
+
+# Envoi par lots : au plus BATCH_SIZE lectures, au plus BATCH_DELAY secondes d'attente
+BATCH_SIZE = 50
+BATCH_DELAY = 0.5
+
+# File bornée entre la lecture série et l'envoi HTTP
+QUEUE_SIZE = 1000
+
+# Connexions HTTP gardées ouvertes (keep-alive)
+HTTP_POOL_SIZE = 4
+HTTP_TIMEOUT = 10
+
+# Lectures non envoyées (API indisponible) : rejouées dans l'ordre au retour de l'API
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool')
+RETRY_MIN_DELAY = 1
+RETRY_MAX_DELAY = 60
+
+
+class DiskSpool:
+    """
+    Spool sur disque des lectures non envoyées : une lecture JSON par ligne, ajoutées à la fin,
+    consommées depuis le début. La position de lecture est conservée dans un fichier à part,
+    ce qui permet de reprendre après un redémarrage de la passerelle.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'pending.ndjson')
+        self.offset_path = os.path.join(directory, 'pending.offset')
+
+    def _offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def is_empty(self):
+        try:
+            return os.path.getsize(self.path) <= self._offset()
+        except FileNotFoundError:
+            return True
+
+    def append(self, readings):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for reading in readings:
+                f.write(json.dumps(reading) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def peek(self, max_items):
+        """Retourne (les prochaines lectures, position après ces lectures) sans les consommer"""
+        readings = []
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset())
+            while len(readings) < max_items:
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    readings.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Ligne tronquée (arrêt brutal pendant l'écriture) : ignorée
+                    pass
+            return readings, f.tell()
+
+    def commit(self, offset):
+        """Marque comme envoyées les lectures jusqu'à `offset` ; vide le spool s'il est épuisé"""
+        if offset >= os.path.getsize(self.path):
+            os.remove(self.path)
+            if os.path.exists(self.offset_path):
+                os.remove(self.offset_path)
+            return
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self.offset_path)
+
+
+class SerialToApiGateway:
+    """
+    Passerelle asynchrone : la lecture série (thread bloquant) alimente une file asyncio bornée,
+    l'envoi regroupe les lectures en lots et les poste sur une session HTTP keep-alive.
+    Un lot qui n'a pas pu être envoyé part dans le spool ; tant que le spool n'est pas vide,
+    les nouveaux lots y sont ajoutés derrière pour conserver l'ordre.
+    """
+
+    def __init__(self, port=PORT, baud_rate=BAUD_RATE, api_url=BULK_API_URL, spool_dir=SPOOL_DIR):
+        self.reader = SerialLineReader(port, baud_rate)
+        self.api_url = api_url
+        self.spool = DiskSpool(spool_dir)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.http_executor = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE)
+        self.queue = None
+        self.loop = None
+        self.retry_delay = RETRY_MIN_DELAY
+        # Prochain renvoi du spool autorisé (loop.time()) : les lots reçus entre-temps sont seulement mis en spool
+        self.next_retry_at = 0
+
+    def _read_serial(self):
+        """Thread de lecture : pousse chaque lecture JSON dans la file asyncio (bloque si elle est pleine)"""
+        for line in self.reader.read_lines():
+            # Vérifier si c'est un JSON
+            if line.startswith('{') and line.endswith('}'):
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"❌ Erreur JSON invalide: {line}")
+                    continue
+                print(f"Données reçues: {data}")
+                asyncio.run_coroutine_threadsafe(self.queue.put(data), self.loop).result()
+            else:
+                print(f"Message: {line}")
+        asyncio.run_coroutine_threadsafe(self.queue.put(None), self.loop)
+
+    async def _next_batch(self, timeout):
+        """Attend la première lecture (au plus `timeout`), puis complète le lot jusqu'à BATCH_SIZE ou BATCH_DELAY"""
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if first is None:
+            return None
+        batch = [first]
+        deadline = self.loop.time() + BATCH_DELAY
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                self.queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _send(self, readings):
+        """Poste un lot ; retourne False si l'API est injoignable ou en erreur serveur"""
+        try:
+            response = await self.loop.run_in_executor(
+                self.http_executor,
+                lambda: self.session.post(self.api_url, json=readings, timeout=HTTP_TIMEOUT)
+            )
+        except requests.RequestException as e:
+            print(f"❌ Erreur de connexion à l'API: {e}")
+            return False
+
+        if response.status_code >= 500:
+            print(f"❌ Erreur API: {response.status_code}")
+            return False
+        if response.status_code in (200, 201, 207):
+            try:
+                result = response.json()
+                print(f"✅ Lot envoyé: {result['created']}/{result['received']} lectures enregistrées (code {response.status_code})")
+                for item in result['results']:
+                    if item['status'] == 'error':
+                        print(f"❌ Lecture {item['index']} rejetée: {item['error']}")
+            except (ValueError, KeyError, TypeError):
+                # Réponse inattendue (proxy, page HTML) : le lot a été accepté, ne pas le renvoyer
+                print(f"⚠️ Lot envoyé (code {response.status_code}), réponse illisible: {response.text[:200]}")
+        else:
+            # Lot refusé par l'API (données invalides) : le renvoyer ne changerait rien
+            print(f"❌ Lot refusé par l'API: {response.status_code}")
+            print(response.text)
+        return True
+
+    async def _replay_spool(self):
+        """Rejoue le spool dans l'ordre ; retourne False si l'API est toujours indisponible"""
+        while not self.spool.is_empty():
+            readings, offset = self.spool.peek(BATCH_SIZE)
+            if readings and not await self._send(readings):
+                return False
+            self.spool.commit(offset)
+            print(f"✅ {len(readings)} lectures du spool renvoyées")
+        self.retry_delay = RETRY_MIN_DELAY
+        return True
+
+    def _backoff(self):
+        """Échec d'envoi : prochain essai après retry_delay, doublé jusqu'à RETRY_MAX_DELAY"""
+        self.next_retry_at = self.loop.time() + self.retry_delay
+        self.retry_delay = min(self.retry_delay * 2, RETRY_MAX_DELAY)
+
+    async def _forward(self):
+        while True:
+            # Spool en attente : se réveiller à l'échéance du prochain renvoi
+            timeout = None if self.spool.is_empty() else max(self.next_retry_at - self.loop.time(), 0)
+            batch = await self._next_batch(timeout)
+            if batch is None:
+                break
+
+            if batch:
+                if self.spool.is_empty():
+                    if await self._send(batch):
+                        continue
+                    self._backoff()
+                self.spool.append(batch)
+                print(f"💾 {len(batch)} lectures mises en spool")
+
+            # API indisponible : pas de nouvel essai avant l'échéance, même si les lectures continuent d'arriver
+            if self.loop.time() < self.next_retry_at:
+                continue
+            if not await self._replay_spool():
+                self._backoff()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        # Ouvrir la connexion série (lecture bloquante dans un thread dédié)
+        self.reader.start()
+        print("Connexion série établie. En attente de données...")
+        threading.Thread(target=self._read_serial, daemon=True).start()
+        try:
+            if not self.spool.is_empty():
+                print("💾 Lectures en spool trouvées, renvoi en cours...")
+            await self._forward()
+        finally:
+            self.reader.stop()
+            self.http_executor.shutdown(wait=False)
+            self.session.close()
+            print("Connexion série fermée")
+
 
 def main():
     print(f"Démarrage de la passerelle série vers API...")
     print(f"Port: {PORT}, Baud rate: {BAUD_RATE}")
-    print(f"API URL: {API_URL}")
-    
+    print(f"API URL: {BULK_API_URL}")
+
     try:
-        # Ouvrir la connexion série
-        ser = serial.Serial(PORT, BAUD_RATE, timeout=1)
-        print("Connexion série établie. En attente de données...")
-        
-        while True:
-            # Lire une ligne du port série
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8').strip()
-                
-                # Vérifier si c'est un JSON
-                if line.startswith('{') and line.endswith('}'):
-                    try:
-                        # Analyser le JSON
-                        data = json.loads(line)
-                        print(f"Données reçues: {data}")
-                        
-                        # Envoyer à l'API
-                        response = requests.post(API_URL, json=data)
-                        
-                        # Afficher la réponse
-                        if response.status_code == 200 or response.status_code == 201:
-                            print(f"✅ Données envoyées avec succès! Code: {response.status_code}")
-                        else:
-                            print(f"❌ Erreur API: {response.status_code}")
-                            print(response.text)
-                            
-                    except json.JSONDecodeError:
-                        print(f"❌ Erreur JSON invalide: {line}")
-                    except requests.RequestException as e:
-                        print(f"❌ Erreur de connexion à l'API: {e}")
-                else:
-                    print(f"Message: {line}")
-            
-            # Petite pause
-            time.sleep(0.1)
-            
+        asyncio.run(SerialToApiGateway().run())
     except serial.SerialException as e:
         print(f"❌ Erreur de connexion série: {e}")
     except KeyboardInterrupt:
         print("Programme arrêté par l'utilisateur")
-    finally:
-        # Fermer la connexion série si elle est ouverte
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
-            print("Connexion série fermée")
 
-if __name__== "_main_":
-    main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
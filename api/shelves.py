@@ -3,6 +3,12 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from models import db, Zone, Inventory, Product, SensorData, Alert
 import json
+from alert_index import active_alerts
+from alert_events import alert_events
+from indicator_cache import prediction_indicators
+from readings import normalize_uid, SOURCE_ZONE
+from door_scans import claim_door_scan
+from inventory_service import increment_inventory, reserve_zone_slot
 
 shelves_bp = Blueprint('shelves', __name__)
 
@@ -33,48 +39,34 @@ def process_zone_scan():
                 'message': f'Aucun produit trouvé avec le tag RFID: {rfid_tag}'
             }), 404
         
-        # Vérifier s'il existe un scan récent à la porte (moins de 30 minutes)
-        recent_time = datetime.utcnow() - timedelta(minutes=30)
-        recent_door_scan = SensorData.query.filter(
-            SensorData.value.like(f"%{rfid_tag}%"), 
-            SensorData.stored == False,
-            SensorData.saved_at >= recent_time
-        ).order_by(SensorData.saved_at.desc()).first()
+        def same_weight(door_weight):
+            # Si les poids sont similaires (différence < 50g) ou si les deux sont None
+            return (door_weight is None and weight is None) or \
+               (door_weight is not None and weight is not None and abs(float(door_weight) - float(weight)) < 0.05)
+        
+        # Réserver un scan récent à la porte (moins de 30 minutes) de ce tag et de même poids,
+        # parmi les scans en attente indexés par UID
+        door_scan, pending_scans = claim_door_scan(
+            normalize_uid(rfid_tag), product.id, matches=same_weight, require_match=True
+        )
         
         # Si un scan récent existe
-        if recent_door_scan:
-            door_weight = None
-            try:
-                # Extraire le poids du scan à la porte
-                door_data = json.loads(recent_door_scan.value) if isinstance(recent_door_scan.value, str) else recent_door_scan.value
-                
-                if 'weight' in door_data:
-                    door_weight = door_data['weight']
-                elif isinstance(door_data.get('data'), dict) and 'weight' in door_data['data']:
-                    door_weight = door_data['data']['weight']
-            except:
-                pass
+        if door_scan or pending_scans:
+            # Poids du scan à la porte (kg) : scan réservé, sinon le plus récent en attente
+            door_weight = (door_scan or pending_scans[-1]).weight
             
             # Compare weights (if available)
             print(f"Comparaison: Poids porte={door_weight}, Poids zone={weight}")
             
-            # Si les poids sont similaires (différence < 50g) ou si les deux sont None
-            if (door_weight is None and weight is None) or \
-               (door_weight is not None and weight is not None and abs(float(door_weight) - float(weight)) < 0.05):
-                # Mettre à jour le scan comme stocké
-                recent_door_scan.stored = True
-                recent_door_scan.product_id = product.id
+            if door_scan:
+                # Scan marqué comme stocké par la réservation
                 db.session.commit()
                 
                 # Affecter le produit à la zone spécifiée ou trouver une zone disponible
                 if not zone_id:
-                    # Trouver une zone disponible
-                    zones = Zone.query.all()
-                    for zone in zones:
-                        inventory_count = Inventory.query.filter_by(zone_id=zone.id).count()
-                        if inventory_count < 8:  # 8 emplacements max par zone
-                            zone_id = zone.id
-                            break
+                    # Trouver une zone disponible (emplacement réservé jusqu'au commit)
+                    available_zone = reserve_zone_slot()
+                    zone_id = available_zone.id if available_zone else None
                             
                     if not zone_id:
                         return jsonify({
@@ -90,25 +82,12 @@ def process_zone_scan():
                         'message': f'Zone avec ID {zone_id} non trouvée'
                     }), 404
                 
-                # Créer ou mettre à jour l'inventaire
-                existing_inventory = Inventory.query.filter_by(
-                    product_id=product.id,
-                    zone_id=zone_id
-                ).first()
-                
-                if existing_inventory:
-                    existing_inventory.quantity += 1
-                    existing_inventory.last_update_at = datetime.utcnow()
-                else:
-                    new_inventory = Inventory(
-                        product_id=product.id,
-                        zone_id=zone_id,
-                        quantity=1,
-                        last_update_at=datetime.utcnow()
-                    )
-                    db.session.add(new_inventory)
+                # Créer ou incrémenter l'inventaire (upsert atomique)
+                increment_inventory(product.id, zone_id)
                 
                 db.session.commit()
+                alert_events.enqueue(product.id)
+                prediction_indicators.invalidate()
                 
                 return jsonify({
                     'success': True,
@@ -135,6 +114,7 @@ def process_zone_scan():
                 )
                 db.session.add(new_alert)
                 db.session.commit()
+                active_alerts.register(new_alert.product_id, new_alert.type)
                 
                 return jsonify({
                     'success': True,
@@ -167,7 +147,11 @@ def process_zone_scan():
                 }),
                 stored=True,  # Marquer directement comme stocké
                 product_id=product.id,
-                saved_at=datetime.utcnow()
+                saved_at=datetime.utcnow(),
+                uid=normalize_uid(rfid_tag),
+                weight=weight,
+                zone_id=zone_id,
+                source=SOURCE_ZONE
             )
             db.session.add(new_sensor_data)
             
@@ -181,25 +165,12 @@ def process_zone_scan():
                         'message': f'Zone avec ID {zone_id} non trouvée'
                     }), 404
                     
-                # Créer ou mettre à jour l'inventaire
-                existing_inventory = Inventory.query.filter_by(
-                    product_id=product.id,
-                    zone_id=zone_id
-                ).first()
-                
-                if existing_inventory:
-                    existing_inventory.quantity += 1
-                    existing_inventory.last_update_at = datetime.utcnow()
-                else:
-                    new_inventory = Inventory(
-                        product_id=product.id,
-                        zone_id=zone_id,
-                        quantity=1,
-                        last_update_at=datetime.utcnow()
-                    )
-                    db.session.add(new_inventory)
+                # Créer ou incrémenter l'inventaire (upsert atomique)
+                increment_inventory(product.id, zone_id)
                 
                 db.session.commit()
+                alert_events.enqueue(product.id)
+                prediction_indicators.invalidate()
                 
                 return jsonify({
                     'success': True,
@@ -215,15 +186,8 @@ def process_zone_scan():
                     }
                 }), 200
             else:
-                # Pas de zone spécifiée - trouver une zone disponible
-                zones = Zone.query.all()
-                selected_zone = None
-                
-                for zone in zones:
-                    inventory_count = Inventory.query.filter_by(zone_id=zone.id).count()
-                    if inventory_count < 8:  # 8 emplacements max par zone
-                        selected_zone = zone
-                        break
+                # Pas de zone spécifiée - trouver une zone disponible (emplacement réservé jusqu'au commit)
+                selected_zone = reserve_zone_slot()
                 
                 if not selected_zone:
                     return jsonify({
@@ -231,25 +195,12 @@ def process_zone_scan():
                         'message': 'Aucune zone disponible pour ce produit'
                     }), 400
                 
-                # Créer ou mettre à jour l'inventaire
-                existing_inventory = Inventory.query.filter_by(
-                    product_id=product.id,
-                    zone_id=selected_zone.id
-                ).first()
-                
-                if existing_inventory:
-                    existing_inventory.quantity += 1
-                    existing_inventory.last_update_at = datetime.utcnow()
-                else:
-                    new_inventory = Inventory(
-                        product_id=product.id,
-                        zone_id=selected_zone.id,
-                        quantity=1,
-                        last_update_at=datetime.utcnow()
-                    )
-                    db.session.add(new_inventory)
+                # Créer ou incrémenter l'inventaire (upsert atomique)
+                increment_inventory(product.id, selected_zone.id)
                 
                 db.session.commit()
+                alert_events.enqueue(product.id)
+                prediction_indicators.invalidate()
                 
                 return jsonify({
                     'success': True,
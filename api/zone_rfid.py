@@ -1,7 +1,17 @@
 # Add these imports to your app.py file
 from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
 import json
-from datetime import timedelta
+from datetime import datetime, timedelta
+from models import db, Product, Zone, Inventory, SensorData, RFIDReader
+from alert_events import alert_events
+from generate_alerts import role_required
+from indicator_cache import prediction_indicators
+from readings import normalize_uid, grams_to_kg
+from door_scans import claim_door_scan
+from inventory_service import increment_inventory, reserve_zone_slot, InventoryDeltas
+from rfid_ingest import parse_bulk_payload, bulk_status_code, MAX_BULK_READINGS
+from rfid_supervisor import rfid_supervisor, ROLE_ZONE
 
 zonerfid_bp = Blueprint('zone_rfid', __name__)
 
@@ -9,36 +19,148 @@ zonerfid_bp = Blueprint('zone_rfid', __name__)
 
 # Add these routes to your app.py
 
+def _zone_reader_from_request(data):
+    """Find the zone reader configuration named in the request (by name, or by port)"""
+    name = data.get('name')
+    if name:
+        return RFIDReader.query.filter_by(name=name, role=ROLE_ZONE).first()
+    
+    port = data.get('port', 'COM5')  # Default to COM5 or use specified port
+    return RFIDReader.query.filter_by(port=port, role=ROLE_ZONE).order_by(RFIDReader.id).first()
+
 @zonerfid_bp.route('/api/zone-rfid/start', methods=['POST'])
+@jwt_required()
+@role_required("admin")
 def start_zone_rfid_reader():
-    """Start the Zone RFID reader"""
-    global zone_rfid_handler
-    
+    """
+    Start a configured Zone RFID reader through the reader supervisor.
+    Readers are declared with POST /api/rfid/readers.
+    """
     data = request.get_json() or {}
-    port = data.get('port', 'COM5')  # Default to COM5 or use specified port
     
-    # Import the handler here to avoid circular imports
-    from second_rfid_handler import ZoneRFIDHandler
+    reader = _zone_reader_from_request(data)
+    if reader is None:
+        return jsonify({"error": f"Unknown zone RFID reader: {data.get('name') or data.get('port', 'COM5')}"}), 404
     
-    if zone_rfid_handler is None:
-        zone_rfid_handler = ZoneRFIDHandler(port=port)
-        
-    if zone_rfid_handler.start():
-        return jsonify({"message": f"Zone RFID reader started on {port}"}), 200
-    else:
-        return jsonify({"error": f"Unable to start Zone RFID reader on {port}"}), 500
+    try:
+        started = rfid_supervisor.start(reader)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not started:
+        return jsonify({"message": f"Zone RFID reader {reader.name} is already running on {reader.port}"}), 200
+    return jsonify({
+        "message": f"Zone RFID reader {reader.name} started on {reader.port}",
+        "reader": rfid_supervisor.status(reader)
+    }), 200
 
 @zonerfid_bp.route('/api/zone-rfid/stop', methods=['POST'])
+@jwt_required()
+@role_required("admin")
 def stop_zone_rfid_reader():
-    """Stop the Zone RFID reader"""
-    global zone_rfid_handler
+    """Stop a Zone RFID reader (by name or port)"""
+    data = request.get_json() or {}
     
-    if zone_rfid_handler:
-        zone_rfid_handler.stop()
-        return jsonify({"message": "Zone RFID reader stopped successfully"}), 200
+    reader = _zone_reader_from_request(data)
+    if reader and rfid_supervisor.stop(reader.name):
+        return jsonify({"message": f"Zone RFID reader {reader.name} stopped successfully"}), 200
     else:
         return jsonify({"message": "Zone RFID reader was not running"}), 200
 
+def process_zone_reading(data, inventory=None, zone_ids=None):
+    """
+    Match one zone reader reading against the pending door scans of the same UID and update the inventory.
+    With an InventoryDeltas collector, the increment is only queued and nothing is committed.
+    zone_ids: known zone ids, loaded once by the bulk endpoint (otherwise the zone is looked up).
+    Returns (response body, HTTP status).
+    """
+    # Extract information
+    uid = normalize_uid(data.get('uid', ''))
+    weight = data.get('weight', 0)
+    zone_id = data.get('zone_id')
+    
+    if not uid:
+        return {"error": "Missing RFID UID"}, 400
+    
+    if not zone_id:
+        return {
+            "status": "error",
+            "message": "Missing zone information"
+        }, 400
+    
+    # Unknown zones are rejected here, before the (deferred) inventory write
+    try:
+        zone_id = int(zone_id)
+    except (TypeError, ValueError):
+        return {"status": "error", "message": f"Invalid zone: {zone_id}"}, 400
+    zone_exists = zone_id in zone_ids if zone_ids is not None else db.session.get(Zone, zone_id) is not None
+    if not zone_exists:
+        return {"status": "error", "message": f"Unknown zone: {zone_id}"}, 404
+    
+    product = Product.query.filter_by(rfid_tag=uid).first()
+    if not product:
+        return {
+            "status": "error", 
+            "message": "Unknown product RFID"
+        }, 200
+    
+    # The zone reader sends grams, door readings are stored in kg
+    weight = grams_to_kg(weight) or 0
+    
+    def within_tolerance(door_weight):
+        # Weight tolerance (5% difference allowed)
+        door_weight = door_weight or 0
+        return abs(weight - door_weight) / max(door_weight, 0.001) * 100 <= 5
+    
+    # Pending door scan of this UID, preferring one within the weight tolerance
+    door_scan, _ = claim_door_scan(uid, product.id, matches=within_tolerance)
+    if door_scan is None:
+        # The product was not scanned at entry (or its scan was already matched)
+        return {
+            "status": "error",
+            "message": "Product mismatch! This product has no pending scan at entry.",
+            "zone_uid": uid
+        }, 200
+    
+    last_weight = door_scan.weight or 0
+    weight_diff_percent = abs(weight - last_weight) / max(last_weight, 0.001) * 100
+    weight_match = weight_diff_percent <= 5
+    
+    if inventory is None:
+        # Atomic increment; door scan claim and inventory change are committed together
+        increment_inventory(product.id, zone_id)
+        db.session.commit()
+        alert_events.enqueue(product.id)
+        prediction_indicators.invalidate()
+    else:
+        # Bulk endpoint: written with the other readings of the batch
+        inventory.add(product.id, zone_id)
+    
+    return {
+        "status": "success",
+        "message": "Product correctly placed in zone",
+        "product_id": product.id,
+        "zone_id": zone_id,
+        "door_scan_id": door_scan.record_id,
+        "weight_verified": weight_match,
+        "weight_diff_percent": round(weight_diff_percent, 2)
+    }, 200
+
+
+def process_zone_line(line, reader):
+    """Handle one line from a supervised zone reader (see rfid_supervisor.py)"""
+    if not (line.startswith('{') and line.endswith('}')):
+        print(f"Zone RFID Message ({reader['name']}): {line}")
+        return
+    
+    data = json.loads(line)
+    # Readers bound to a zone do not need to send it with every reading
+    if not data.get('zone_id'):
+        data['zone_id'] = reader['zone_id']
+    
+    body, status = process_zone_reading(data)
+    print(f"Zone RFID ({reader['name']}): {status} {body.get('message') or body.get('error')}")
+
+
 @zonerfid_bp.route('/api/zone-rfid/data', methods=['POST'])
 def receive_zone_rfid_data():
     """Process data from the zone RFID reader"""
@@ -47,102 +169,62 @@ def receive_zone_rfid_data():
         
         if not data:
             return jsonify({"error": "Missing JSON data"}), 400
-            
-        # Extract information
-        uid = data.get('uid', '').upper()
-        weight = data.get('weight', 0)
-        zone_id = data.get('zone_id')
         
-        if not uid:
-            return jsonify({"error": "Missing RFID UID"}), 400
-            
-        # Get the last unprocessed sensor data
-        last_sensor_data = SensorData.query.filter(
-            SensorData.stored == False
-        ).order_by(SensorData.saved_at.desc()).first()
+        body, status = process_zone_reading(data)
+        return jsonify(body), status
         
-        if not last_sensor_data:
-            return jsonify({
-                "status": "warning",
-                "message": "No waiting product to verify"
-            }), 200
-            
-        # Try to parse the sensor data value
-        try:
-            last_data = json.loads(last_sensor_data.value)
-            last_uid = last_data.get('uid', '').upper()
-            last_weight = last_data.get('weight', 0)
-            
-            # If we have a zone_id, check product placement
-            if zone_id:
-                product = Product.query.filter_by(rfid_tag=uid).first()
-                
-                if product:
-                    # Check if this product has inventory in this zone
-                    inventory = Inventory.query.filter_by(
-                        product_id=product.id,
-                        zone_id=zone_id
-                    ).first()
-                    
-                    # Compare UIDs and verify correct placement
-                    if uid == last_uid:
-                        # Weight tolerance (5% difference allowed)
-                        weight_diff_percent = abs(weight - last_weight) / max(last_weight, 1) * 100
-                        weight_match = weight_diff_percent <= 5
-                        
-                        # Update the inventory record
-                        if inventory:
-                            inventory.quantity += 1
-                            db.session.commit()
-                        else:
-                            # Create new inventory record
-                            new_inventory = Inventory(
-                                product_id=product.id,
-                                zone_id=zone_id,
-                                quantity=1
-                            )
-                            db.session.add(new_inventory)
-                            db.session.commit()
-                        
-                        # Mark the sensor data as stored
-                        last_sensor_data.stored = True
-                        db.session.commit()
-                        
-                        return jsonify({
-                            "status": "success",
-                            "message": "Product correctly placed in zone",
-                            "product_id": product.id,
-                            "zone_id": zone_id,
-                            "weight_verified": weight_match,
-                            "weight_diff_percent": round(weight_diff_percent, 2)
-                        }), 200
-                    else:
-                        # RFID doesn't match the last scanned product
-                        return jsonify({
-                            "status": "error",
-                            "message": "Product mismatch! This is not the same product that was scanned at entry.",
-                            "entry_uid": last_uid,
-                            "zone_uid": uid
-                        }), 200
-                else:
-                    return jsonify({
-                        "status": "error", 
-                        "message": "Unknown product RFID"
-                    }), 200
-            else:
-                return jsonify({
-                    "status": "error",
-                    "message": "Missing zone information"
-                }), 400
-                
-        except (json.JSONDecodeError, AttributeError):
-            return jsonify({
-                "status": "error", 
-                "message": "Invalid data format in sensor data",
-                "raw_value": last_sensor_data.value
-            }), 200
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@zonerfid_bp.route('/api/zone-rfid/data/bulk', methods=['POST'])
+def receive_zone_rfid_data_bulk():
+    """Process a batch of zone reader readings (JSON array or NDJSON), in order, with one result per reading"""
+    try:
+        readings = parse_bulk_payload(request)
+        if not readings:
+            return jsonify({"error": "No readings in request"}), 400
+        if len(readings) > MAX_BULK_READINGS:
+            return jsonify({"error": f"At most {MAX_BULK_READINGS} readings per request"}), 413
+        
+        results = []
+        processed = 0
+        inventory = InventoryDeltas()
+        zone_ids = {zone_id for (zone_id,) in db.session.query(Zone.id)}
+        for index, reading in enumerate(readings):
+            if not isinstance(reading, dict) or '_error' in reading:
+                error = reading.get('_error') if isinstance(reading, dict) else 'Invalid reading'
+                results.append({"index": index, "http_status": 400, "error": error})
+                continue
+            try:
+                # A failing reading only rolls back its own savepoint
+                with db.session.begin_nested():
+                    body, status = process_zone_reading(reading, inventory, zone_ids)
+            except Exception as e:
+                body, status = {"error": str(e)}, 500
+            if status < 400:
+                processed += 1
+            results.append(dict(body, index=index, http_status=status))
+        
+        # One upsert for all the placements of the batch, committed with the door scan claims
+        placed_product_ids = inventory.product_ids
+        inventory.apply()
+        db.session.commit()
+        for product_id in placed_product_ids:
+            alert_events.enqueue(product_id)
+        prediction_indicators.invalidate()
+        
+        return jsonify({
+            "received": len(readings),
+            "processed": processed,
+            "errors": len(readings) - processed,
+            "results": results
+        }), bulk_status_code(processed, len(readings))
         
     except Exception as e:
+        db.session.rollback()
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -167,55 +249,31 @@ def process_zone_rfid():
         if not product:
             return jsonify({"error": f"Aucun produit trouvé avec le tag RFID: {rfid_tag}"}), 404
         
-        # Rechercher une zone disponible
-        zones = Zone.query.all()
-        selected_zone = None
-        
-        for zone in zones:
-            # Vérifier l'espace disponible dans la zone
-            inventory_count = Inventory.query.filter_by(zone_id=zone.id).count()
-            if inventory_count < 8:  # 8 emplacements par zone
-                selected_zone = zone
-                break
+        # Rechercher une zone disponible (emplacement réservé jusqu'au commit)
+        selected_zone = reserve_zone_slot()
         
         if not selected_zone:
             return jsonify({"error": "Aucune zone disponible actuellement"}), 400
         
-        # Vérifier si le produit est déjà dans cette zone
-        existing_inventory = Inventory.query.filter_by(
-            product_id=product.id,
-            zone_id=selected_zone.id
-        ).first()
+        # Incrémenter (ou créer) l'inventaire du produit dans cette zone
+        quantity = increment_inventory(product.id, selected_zone.id)
+        db.session.commit()
+        alert_events.enqueue(product.id)
+        prediction_indicators.invalidate()
         
-        if existing_inventory:
-            # Mettre à jour l'inventaire existant
-            existing_inventory.quantity += 1
-            existing_inventory.last_update_at = datetime.utcnow()
-            db.session.commit()
-            
+        if quantity > 1:
             return jsonify({
-                "message": f"Produit {product.designation} ajouté à la zone {selected_zone.name} (quantité: {existing_inventory.quantity})",
+                "message": f"Produit {product.designation} ajouté à la zone {selected_zone.name} (quantité: {quantity})",
                 "zone_id": selected_zone.id,
                 "product_id": product.id,
-                "quantity": existing_inventory.quantity
+                "quantity": quantity
             }), 200
         else:
-            # Créer un nouvel inventaire
-            new_inventory = Inventory(
-                product_id=product.id,
-                zone_id=selected_zone.id,
-                quantity=1,
-                last_update_at=datetime.utcnow()
-            )
-            
-            db.session.add(new_inventory)
-            db.session.commit()
-            
             return jsonify({
                 "message": f"Produit {product.designation} affecté à la zone {selected_zone.name}",
                 "zone_id": selected_zone.id,
                 "product_id": product.id,
-                "quantity": 1
+                "quantity": quantity
             }), 201
             
     except Exception as e: